@@ -0,0 +1,183 @@
+import heapq
+import itertools
+import logging
+import threading
+import time
+
+from config.app_config import (
+    ADMISSION_MAX_CONCURRENT,
+    ADMISSION_QUEUE_TIMEOUT_SECONDS,
+    ADMISSION_LEASE_SECONDS,
+    ADMISSION_INITIAL_SERVICE_SECONDS,
+    ADMISSION_USER_WEIGHTS,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class AdmissionTicket:
+    """一次获准执行的分析所占用的名额，release() 可重复调用"""
+
+    def __init__(self, controller, user_key, start_tag, finish_tag):
+        self._controller = controller
+        self.user_key = user_key
+        self.start_tag = start_tag
+        self.finish_tag = finish_tag
+        self.acquired_at = None
+        self.released = False
+
+    def release(self):
+        self._controller._release(self)
+
+
+class AdmissionController:
+    """进程级准入控制：限制同时进行的分析数，超出时按用户加权公平排队
+
+    采用加权公平排队（WFQ）：每个请求按 “max(虚拟时间, 该用户上次结束标签) + 1 / 权重”
+    得到结束标签，名额空出时优先放行标签最小的请求。
+    同一用户连续提交的请求标签依次递增，因此单个用户的突发请求不会挤占其他用户。
+    """
+
+    POLL_INTERVAL = 1.0  # 排队时刷新位置与预计等待时间的间隔 (秒)
+
+    def __init__(self, max_concurrent=8, queue_timeout=120.0, lease_seconds=600.0,
+                 initial_service_seconds=15.0, weights=None, alpha=0.2):
+        self.max_concurrent = max_concurrent
+        self.queue_timeout = queue_timeout
+        self.lease_seconds = lease_seconds
+        self.weights = weights or {}
+        self.alpha = alpha
+        self.avg_service_seconds = initial_service_seconds
+        self._cond = threading.Condition()
+        self._active = {}  # ticket -> 名额到期时间
+        self._queue = []  # (finish_tag, seq, ticket)
+        self._seq = itertools.count()
+        self._virtual_time = 0.0
+        self._last_finish = {}
+        self._counters = {"admitted": 0, "queued": 0, "timed_out": 0, "abandoned": 0, "reclaimed": 0}
+
+    def acquire(self, user_key, on_wait=None):
+        """申请一个名额，必要时排队等待
+
+        on_wait(position, eta_seconds) 在排队位置或预计等待时间变化时于调用线程中执行；
+        回调抛出异常（例如 Streamlit 重新运行）时请求会移出队列，不会阻塞后面的请求。
+        超过 queue_timeout 仍未获准时返回 None，否则返回 AdmissionTicket。
+        """
+        with self._cond:
+            weight = self.weights.get(user_key, 1.0) or 1.0
+            start_tag = max(self._virtual_time, self._last_finish.get(user_key, 0.0))
+            ticket = AdmissionTicket(self, user_key, start_tag, start_tag + 1.0 / weight)
+            self._last_finish[user_key] = ticket.finish_tag
+            heapq.heappush(self._queue, (ticket.finish_tag, next(self._seq), ticket))
+            deadline = time.monotonic() + self.queue_timeout
+
+        waited = False
+        last_status = None
+        try:
+            while True:
+                status = None
+                with self._cond:
+                    now = time.monotonic()
+                    self._reclaim_expired(now)
+                    if self._queue[0][2] is ticket and len(self._active) < self.max_concurrent:
+                        return self._admit(ticket, now, queued=waited)
+                    if now >= deadline:
+                        self._drop(ticket)
+                        logger.warning(f"用户 {ticket.user_key} 排队超时，未获准执行分析")
+                        self._counters["timed_out"] += 1
+                        return None
+                    waited = True
+                    current = self._status(ticket, now)
+                    if on_wait is not None and current != last_status:
+                        status = last_status = current
+                    else:
+                        self._cond.wait(timeout=min(deadline - now, self.POLL_INTERVAL))
+                if status is not None:
+                    # 回调可能更新界面，放在锁外执行
+                    on_wait(*status)
+        except BaseException:
+            # 仍在队首的请求会挡住后面所有请求，必须移出队列
+            with self._cond:
+                if ticket.acquired_at is None:
+                    self._drop(ticket)
+                    self._counters["abandoned"] += 1
+            raise
+
+    def _admit(self, ticket, now, queued):
+        heapq.heappop(self._queue)
+        ticket.acquired_at = now
+        self._active[ticket] = now + self.lease_seconds
+        self._virtual_time = max(self._virtual_time, ticket.start_tag)
+        self._counters["admitted"] += 1
+        if queued:
+            self._counters["queued"] += 1
+        self._cond.notify_all()  # 新的队首可能也能获准
+        return ticket
+
+    def _drop(self, ticket):
+        self._queue = [entry for entry in self._queue if entry[2] is not ticket]
+        heapq.heapify(self._queue)
+        self._cond.notify_all()
+
+    def _release(self, ticket):
+        with self._cond:
+            if ticket.released:
+                return
+            ticket.released = True
+            if self._active.pop(ticket, None) is not None:
+                duration = time.monotonic() - ticket.acquired_at
+                self.avg_service_seconds += self.alpha * (duration - self.avg_service_seconds)
+            self._cond.notify_all()
+
+    def _reclaim_expired(self, now):
+        """回收超过租期仍未释放的名额（调用方异常中断、流式输出未被读完等）"""
+        for ticket, expires_at in list(self._active.items()):
+            if expires_at <= now:
+                del self._active[ticket]
+                ticket.released = True
+                self._counters["reclaimed"] += 1
+                logger.warning(f"回收用户 {ticket.user_key} 超时未释放的分析名额")
+
+    def _status(self, ticket, now):
+        """返回 (前面排队的请求数, 预计等待秒数)"""
+        key = next(entry[:2] for entry in self._queue if entry[2] is ticket)
+        position = sum(1 for entry in self._queue if entry[:2] < key)
+        if self._active:
+            soonest = min(
+                max(0.0, self.avg_service_seconds - (now - active.acquired_at)) for active in self._active
+            )
+        else:
+            soonest = 0.0
+        eta = soonest + (position // self.max_concurrent) * self.avg_service_seconds
+        return position, int(round(eta))
+
+    def stats(self):
+        """返回当前并发、排队与累计统计，便于运维查看"""
+        with self._cond:
+            return {
+                "active": len(self._active),
+                "waiting": len(self._queue),
+                "max_concurrent": self.max_concurrent,
+                "avg_service_seconds": round(self.avg_service_seconds, 1),
+                **self._counters,
+            }
+
+
+_controller = None
+_controller_lock = threading.Lock()
+
+
+def get_admission_controller():
+    """获取进程内共享的准入控制器"""
+    global _controller
+    if _controller is None:
+        with _controller_lock:
+            if _controller is None:
+                _controller = AdmissionController(
+                    max_concurrent=ADMISSION_MAX_CONCURRENT,
+                    queue_timeout=ADMISSION_QUEUE_TIMEOUT_SECONDS,
+                    lease_seconds=ADMISSION_LEASE_SECONDS,
+                    initial_service_seconds=ADMISSION_INITIAL_SERVICE_SECONDS,
+                    weights=ADMISSION_USER_WEIGHTS,
+                )
+    return _controller
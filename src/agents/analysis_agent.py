@@ -1,4 +1,32 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+from agents.admission import get_admission_controller
 from agents.model_manager import ModelManager
+from agents.rate_limiter import get_rate_limiter, format_retry_after
+from agents.token_budget import estimate_request_tokens
+from agents.usage_store import get_usage_store
+from config.app_config import (
+    ANALYSIS_MODE,
+    MAP_REDUCE_MIN_SECTIONS,
+    MAP_REDUCE_MIN_TOKENS,
+    MAP_REDUCE_MAX_SECTIONS,
+    MAP_REDUCE_MAX_WORKERS,
+    MAP_REDUCE_MAX_CONCURRENT_CALLS,
+    USER_DAILY_TOKEN_BUDGET,
+    USER_MONTHLY_TOKEN_BUDGET,
+)
+from config.prompts import SPECIALIST_PROMPTS
+from utils.lab_parser import PROMPT_HEADER, split_report_sections
+from utils.token_estimator import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+# 准入控制按分析计数，一个分析可并发多个分节调用；这里限制全进程同时进行的分节调用总数
+_section_call_slots = threading.BoundedSemaphore(MAP_REDUCE_MAX_CONCURRENT_CALLS)
 
 
 class AnalysisAgent:
@@ -12,16 +40,49 @@ class AnalysisAgent:
         """初始化 AnalysisAgent 代理实例"""
         self.model_manager = ModelManager()  # 创建模型管理器，用于实际调用大模型
             
-    def check_rate_limit(self):
+    def check_rate_limit(self, user_id=None, consume=False):
         """检查当前用户是否触达分析次数上限
 
-        目前配置为不限次数，因此始终返回允许分析。
+        按用户限制滚动 24 小时内的分析次数（ANALYSIS_DAILY_LIMIT）与短时连续请求，
+        计数保存在所有服务进程共享的存储中；未提供 user_id 的内部调用（如批量工具）不受限制。
+
+        参数:
+            user_id: 当前登录用户 ID
+            consume: 为 True 时计入一次分析；预检时为 False
         返回:
-            (True, None)
+            (是否允许, 错误信息)，拒绝时错误信息中包含可重试的等待时间
         """
-        return True, None
+        allowed, retry_after = self._check_limit(user_id, consume)
+        if allowed:
+            return True, None
+        return False, self._limit_message(retry_after)
 
-    def analyze_report(self, data, system_prompt, check_only=False, chat_history=None):
+    @staticmethod
+    def _limit_message(retry_after):
+        return f"已达到分析次数上限，请在 {format_retry_after(retry_after)} 后重试"
+
+    @staticmethod
+    def _check_limit(user_id, consume, now=None):
+        """返回 (是否允许, 需要等待的秒数)"""
+        if user_id is None:
+            return True, 0.0
+        return get_rate_limiter().check(user_id, consume=consume, now=now)
+
+    @staticmethod
+    def _refund_limit(user_id, consumed_at):
+        """分析失败时退还已计入的一次分析"""
+        if user_id is not None:
+            get_rate_limiter().refund(user_id, consumed_at)
+
+    def _limited_result(self, retry_after):
+        return {
+            "success": False,
+            "error": self._limit_message(retry_after),
+            "retry_after": retry_after,
+        }
+
+    def analyze_report(self, data, system_prompt, check_only=False, chat_history=None, stream=False,
+                       mode=None, user_id=None, on_queue=None):
         """分析体检报告数据的主入口
 
         参数:
@@ -29,16 +90,218 @@ class AnalysisAgent:
             system_prompt: 系统提示词，控制模型输出风格
             check_only: 为 True 时仅做额度检查，不真正调用模型
             chat_history: 当前会话中已有的聊天记录（预留扩展）
+            stream: 为 True 时返回结果中的 "stream" 为逐段产出文本的 AnalysisStream
+            mode: "single" / "map_reduce" / "auto"，默认使用 ANALYSIS_MODE
+            user_id: 发起分析的用户 ID，用于按用户限流
+            on_queue: 排队时的回调 on_queue(前面的请求数, 预计等待秒数)，用于展示排队状态
         """
-        can_analyze, error_msg = self.check_rate_limit()
-        if not can_analyze:
-            return {"success": False, "error": error_msg}
-        
         if check_only:
             # 调用方只希望查询是否允许分析，此时直接返回检查结果
-            return can_analyze, error_msg
+            return self.check_rate_limit(user_id)
+
+        # 先检查 token 预算：被预算拒绝的请求不应占用分析次数
+        budget_error = self._check_token_budget(user_id, data, system_prompt, mode)
+        if budget_error:
+            return {"success": False, "error": budget_error}
+
+        # 先预检次数限制（不计数），已超限的请求无需排队
+        allowed, retry_after = self._check_limit(user_id, consume=False)
+        if not allowed:
+            return self._limited_result(retry_after)
+
+        # 进程内并发达到上限时按用户公平排队；名额在分析（含流式输出）结束后释放
+        ticket = get_admission_controller().acquire(user_id or "__system__", on_wait=on_queue)
+        if ticket is None:
+            return {"success": False, "error": "当前分析请求较多，排队超时，请稍后重试"}
+
+        # 拿到名额后才计入一次分析（排队期间可能已被同一用户的其他请求用完）；分析失败时退还
+        consumed_at = time.time()
+        allowed, retry_after = self._check_limit(user_id, consume=True, now=consumed_at)
+        if not allowed:
+            ticket.release()
+            return self._limited_result(retry_after)
+        try:
+            result = self._run_analysis(data, system_prompt, stream, mode, user_id)
+        except BaseException:
+            ticket.release()
+            self._refund_limit(user_id, consumed_at)
+            raise
+        analysis_stream = result.get("stream") if result.get("success") else None
+        if analysis_stream is not None:
+            def finish(finished):
+                ticket.release()
+                if finished.error:
+                    self._refund_limit(user_id, consumed_at)
+            analysis_stream.add_done_callback(finish)
+        else:
+            ticket.release()
+            if not result["success"]:
+                self._refund_limit(user_id, consumed_at)
+        return result
+
+    def _run_analysis(self, data, system_prompt, stream, mode, user_id):
+        """按分析模式执行分析：长报告分节并行，失败或不适用时整份报告一次分析"""
+        sections = self._plan_sections(data, mode or ANALYSIS_MODE)
+        if sections:
+            result = self._analyze_sections(sections, system_prompt, stream, user_id)
+            if result["success"]:
+                return result
+            logger.warning(f"分节分析失败，改为整份报告分析: {result['error']}")
+            # 已完成的分节调用已计入用量，回退的整份报告调用需要重新检查预算
+            budget_error = self._check_token_budget(user_id, data, system_prompt, "single")
+            if budget_error:
+                return {"success": False, "error": budget_error}
 
         # 使用模型管理器生成分析结果
-        result = self.model_manager.generate_analysis(data, system_prompt)
+        result = self._generate(data, system_prompt, stream, user_id)
+
+        return result
+
+    def _check_token_budget(self, user_id, data, system_prompt, mode=None):
+        """调用模型前检查用户的 token 预算，超出时返回错误信息
+
+        本次分析按计划发出的全部调用的“预估输入 + 最大输出”计入，避免单次大报告越过预算。
+        """
+        if user_id is None or (USER_DAILY_TOKEN_BUDGET is None and USER_MONTHLY_TOKEN_BUDGET is None):
+            return None
+        requested = self._estimate_analysis_tokens(data, system_prompt, mode)
+        now = datetime.now(timezone.utc)
+        store = get_usage_store()
+        for budget, since_day, period in (
+            (USER_DAILY_TOKEN_BUDGET, now.strftime("%Y-%m-%d"), "今日"),
+            (USER_MONTHLY_TOKEN_BUDGET, now.strftime("%Y-%m-01"), "本月"),
+        ):
+            if budget is None:
+                continue
+            used = store.total_tokens(user_id, since_day)
+            if used + requested > budget:
+                logger.info(f"用户 {user_id} {period} token 预算不足: 已用 {used}，本次预估 {requested}，上限 {budget}")
+                return f"{period} token 用量已接近上限（已用 {used} / {budget}），请稍后再试或联系管理员"
+        return None
+
+    def _estimate_analysis_tokens(self, data, system_prompt, mode):
+        """预估一次分析最多消耗的 token 数
+
+        map-reduce 时计入每个分节调用，以及汇总调用（输入为各分节最多 MAX_TOKENS 的输出）。
+        """
+        max_tokens = self.model_manager.MAX_TOKENS
+        sections = self._plan_sections(data, mode or ANALYSIS_MODE)
+        if not sections:
+            return estimate_request_tokens(system_prompt, self.model_manager._format_user_content(data)) + max_tokens
+
+        section_prompt = SPECIALIST_PROMPTS["section_analyst"]
+        requested = sum(
+            estimate_request_tokens(section_prompt, self.model_manager._format_user_content({"report": text}))
+            + max_tokens
+            for _, text in sections
+        )
+        merge_prompt = f"{system_prompt}\n\n{SPECIALIST_PROMPTS['report_merger']}"
+        titles = "\n\n".join(f"### {title}\n" for title, _ in sections)
+        merge_input = estimate_request_tokens(merge_prompt, titles) + len(sections) * max_tokens
+        return requested + merge_input + max_tokens
+
+    def _generate(self, data, system_prompt, stream, user_id):
+        """调用模型管理器，并把本次调用的 token 用量计入用户名下"""
+        result = self.model_manager.generate_analysis(data, system_prompt, stream=stream)
+        self._record_usage(user_id, result)
+        return result
+
+    @staticmethod
+    def _record_usage(user_id, result):
+        """记录实际 token 用量；服务端未返回用量时按本地估算值记录
+
+        缓存命中与共享其他进行中请求的结果（single-flight）不计入。
+        """
+        if user_id is None or not result.get("success") or result.get("cached") or result.get("shared"):
+            return
+        model = result.get("model_used")
+        estimated_prompt = result.get("estimated_prompt_tokens") or 0
+
+        def store(usage, content):
+            if usage:
+                prompt_tokens, completion_tokens = usage.get("prompt_tokens", 0), usage.get("completion_tokens", 0)
+            else:
+                prompt_tokens, completion_tokens = estimated_prompt, estimate_tokens(content or "")
+            get_usage_store().record(user_id, model, prompt_tokens, completion_tokens)
+
+        analysis_stream = result.get("stream")
+        if analysis_stream is None:
+            store(result.get("usage"), result.get("content"))
+        else:
+            analysis_stream.add_done_callback(lambda finished: store(finished.usage, finished.content))
+
+    @staticmethod
+    def _plan_sections(data, mode):
+        """判断是否按分节拆分报告，需要拆分时返回 [(分节名, 内容)]，否则返回 None"""
+        if mode == "single" or not isinstance(data, dict) or set(data) != {"report"}:
+            return None
+        report = str(data["report"])
+        sections = split_report_sections(report)
+        if len(sections) < 2:
+            return None
+        if mode == "auto" and (
+            len(sections) < MAP_REDUCE_MIN_SECTIONS or estimate_tokens(report) < MAP_REDUCE_MIN_TOKENS
+        ):
+            return None
+
+        # 紧凑格式的报告需要在每个分节前带上列说明
+        header = PROMPT_HEADER + "\n" if report.startswith(PROMPT_HEADER) else ""
+        chunks = [
+            (title or "基本信息", f"{header}## {title}\n{body}" if title else f"{header}{body}")
+            for title, body in sections
+        ]
+        return AnalysisAgent._group_sections(chunks, MAP_REDUCE_MAX_SECTIONS)
+
+    @staticmethod
+    def _group_sections(chunks, max_groups):
+        """分节过多时按顺序合并相邻分节，使每组的 token 数大致均衡"""
+        if len(chunks) <= max_groups:
+            return chunks
+        sizes = [estimate_tokens(text) for _, text in chunks]
+        remaining = sum(sizes)
+        groups, titles, texts, size = [], [], [], 0
+        for (title, text), chunk_size in zip(chunks, sizes):
+            # 每组的目标大小按剩余内容与剩余组数动态计算，避免最后一组过大
+            target = remaining / (max_groups - len(groups))
+            if texts and size + chunk_size > target and len(groups) < max_groups - 1:
+                groups.append(("、".join(titles), "\n".join(texts)))
+                remaining -= size
+                titles, texts, size = [], [], 0
+            titles.append(title)
+            texts.append(text)
+            size += chunk_size
+        groups.append(("、".join(titles), "\n".join(texts)))
+        return groups
+
+    def _generate_section(self, text, section_prompt, user_id):
+        """分析单个分节；等待全进程共享的分节调用名额"""
+        with _section_call_slots:
+            return self._generate({"report": text}, section_prompt, False, user_id)
+
+    def _analyze_sections(self, sections, system_prompt, stream, user_id=None):
+        """map-reduce 分析：各分节并发分析（并发数受限），再汇总为完整报告
+
+        每个分节是一次独立的模型调用，其结果按分节内容单独缓存，
+        同一分节在其他报告中重复出现时可直接复用。
+        """
+        section_prompt = SPECIALIST_PROMPTS["section_analyst"]
+        workers = min(MAP_REDUCE_MAX_WORKERS, len(sections))
+        logger.info(f"报告拆分为 {len(sections)} 个分节，并发数 {workers}")
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(
+                lambda section: self._generate_section(section[1], section_prompt, user_id),
+                sections,
+            ))
+
+        failed = [title for (title, _), result in zip(sections, results) if not result["success"]]
+        if failed:
+            return {"success": False, "error": f"分节分析失败: {'、'.join(failed)}"}
 
+        summary = "\n\n".join(
+            f"### {title}\n{result['content']}" for (title, _), result in zip(sections, results)
+        )
+        merge_prompt = f"{system_prompt}\n\n{SPECIALIST_PROMPTS['report_merger']}"
+        result = self._generate({"report": summary}, merge_prompt, stream, user_id)
+        if result["success"]:
+            result["sections"] = len(sections)
         return result
@@ -0,0 +1,69 @@
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class AnalysisStream:
+    """模型流式输出的包装器
+
+    - 作为迭代器逐段产出文本，可直接交给 st.write_stream 渲染
+    - 同时累积完整内容，并在结束或出错时记录状态，供调用方保存结果
+    - 可注册 on_complete 回调，在完整生成后执行（例如写入缓存）
+    """
+
+    def __init__(self, first_chunk, chunks, model_used, on_complete=None):
+        """初始化流式结果
+
+        参数:
+            first_chunk: 已经读取到的首段文本（用于在返回前确认模型可用）
+            chunks: 剩余文本片段的迭代器
+            model_used: 实际使用的 "提供商/模型" 名称
+            on_complete: 生成完整结束后调用的回调，参数为本对象
+        """
+        self._first_chunk = first_chunk
+        self._chunks = chunks
+        self.model_used = model_used
+        self._on_complete = [on_complete] if on_complete else []
+        self._parts = []
+        self.error = None
+        self.completed = False
+        self.usage = None  # 服务端返回的 token 用量（如有）
+
+    @property
+    def content(self):
+        """已经产出的全部文本"""
+        return "".join(self._parts)
+
+    def add_done_callback(self, callback):
+        """追加一个结束回调（无论成功或失败都会调用）"""
+        self._on_complete.append(callback)
+
+    def close(self):
+        """放弃尚未读取的输出并关闭底层连接（不触发结束回调）"""
+        close = getattr(self._chunks, "close", None)
+        if close:
+            close()
+
+    def __iter__(self):
+        try:
+            if self._first_chunk:
+                self._parts.append(self._first_chunk)
+                yield self._first_chunk
+            for text in self._chunks:
+                if text:
+                    self._parts.append(text)
+                    yield text
+            self.completed = True
+        except Exception as e:
+            # 首个 token 之后的失败无法再降级，只记录错误交由调用方提示
+            self.error = str(e)
+            logger.warning(f"模型 {self.model_used} 流式输出中断: {self.error}")
+        finally:
+            close = getattr(self._chunks, "close", None)
+            if close:
+                close()
+            for callback in self._on_complete:
+                try:
+                    callback(self)
+                except Exception as e:
+                    logger.error(f"流式输出回调执行失败: {str(e)}")
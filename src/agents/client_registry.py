@@ -0,0 +1,114 @@
+import logging
+import threading
+
+import groq
+import httpx
+import streamlit as st
+
+from config.settings import get_setting
+from config.app_config import (
+    GROQ_MAX_CONNECTIONS,
+    GROQ_MAX_KEEPALIVE_CONNECTIONS,
+    GROQ_KEEPALIVE_EXPIRY_SECONDS,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class ClientRegistry:
+    """进程级模型客户端注册表
+
+    所有浏览器会话共用同一个 Groq 客户端及其 HTTP 连接池，
+    避免每个会话各自建立 TLS 连接、保留大量空闲 socket。
+    """
+
+    def __init__(self, max_connections=100, max_keepalive_connections=20, keepalive_expiry=30.0):
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self._clients = {}
+        self._http_clients = {}
+        self._lock = threading.Lock()
+        self._counters = {"requests": 0, "responses": 0, "clients_created": 0}
+
+    def get_client(self, provider="groq"):
+        """获取（必要时创建）指定提供商的共享客户端，线程安全"""
+        client = self._clients.get(provider)
+        if client is not None:
+            return client
+        with self._lock:
+            client = self._clients.get(provider)
+            if client is None:
+                client = self._create_client(provider)
+                self._clients[provider] = client
+                self._counters["clients_created"] += 1
+            return client
+
+    def _create_client(self, provider):
+        if provider != "groq":
+            raise ValueError(f"不支持的模型提供商: {provider}")
+        http_client = httpx.Client(
+            limits=self.limits,
+            event_hooks={
+                "request": [lambda request: self._count("requests")],
+                "response": [lambda response: self._count("responses")],
+            },
+        )
+        self._http_clients[provider] = http_client
+        logger.info(f"创建共享 {provider} 客户端，连接池上限 {self.limits.max_connections}")
+        # 重试与退避统一由 ModelManager 负责，关闭 SDK 内置的自动重试
+        return groq.Groq(
+            api_key=get_setting("GROQ_API_KEY"),
+            base_url=get_setting("GROQ_BASE_URL"),  # 为空时使用官方地址；压测时可指向本地模拟服务
+            http_client=http_client,
+            max_retries=0,
+        )
+
+    def _count(self, name):
+        with self._lock:
+            self._counters[name] += 1
+
+    def stats(self):
+        """返回各提供商连接池的统计信息"""
+        with self._lock:
+            stats = {
+                **self._counters,
+                "max_connections": self.limits.max_connections,
+                "max_keepalive_connections": self.limits.max_keepalive_connections,
+                "providers": {},
+            }
+            for provider, http_client in self._http_clients.items():
+                stats["providers"][provider] = self._pool_stats(http_client)
+        return stats
+
+    @staticmethod
+    def _pool_stats(http_client):
+        """读取 httpx 底层连接池中的活跃/空闲连接数（尽力而为）"""
+        pool = getattr(getattr(http_client, "_transport", None), "_pool", None)
+        connections = list(getattr(pool, "connections", []) or [])
+        idle = sum(1 for conn in connections if getattr(conn, "is_idle", lambda: False)())
+        return {
+            "connections": len(connections),
+            "idle": idle,
+            "active": len(connections) - idle,
+        }
+
+    def close(self):
+        """关闭所有共享的 HTTP 连接"""
+        with self._lock:
+            for http_client in self._http_clients.values():
+                http_client.close()
+            self._http_clients.clear()
+            self._clients.clear()
+
+
+@st.cache_resource
+def get_client_registry():
+    """通过 Streamlit 资源缓存获取进程内唯一的客户端注册表"""
+    return ClientRegistry(
+        max_connections=GROQ_MAX_CONNECTIONS,
+        max_keepalive_connections=GROQ_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=GROQ_KEEPALIVE_EXPIRY_SECONDS,
+    )
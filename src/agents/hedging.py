@@ -0,0 +1,129 @@
+import logging
+import threading
+from concurrent.futures import Future, FIRST_COMPLETED, wait
+
+from config.app_config import HEDGE_MAX_EXTRA_RATIO, HEDGE_BUDGET_BURST
+
+logger = logging.getLogger(__name__)
+
+
+class HedgeCancelled(Exception):
+    """对冲请求中落败的一方被主动取消"""
+
+
+class HedgeBudget:
+    """限制对冲请求带来的额外开销
+
+    每次普通调用积累 max_extra_ratio 个额度（最多累积 burst 个），
+    每次发起对冲消耗 1 个额度，因此长期来看对冲调用数不超过总调用数的该比例。
+    """
+
+    def __init__(self, max_extra_ratio=0.1, burst=5.0):
+        self.max_extra_ratio = max_extra_ratio
+        self.burst = burst
+        self._credits = burst
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.hedges = 0
+
+    def record_call(self):
+        with self._lock:
+            self.calls += 1
+            self._credits = min(self.burst, self._credits + self.max_extra_ratio)
+
+    def try_acquire(self):
+        with self._lock:
+            if self._credits < 1:
+                return False
+            self._credits -= 1
+            self.hedges += 1
+            return True
+
+    def stats(self):
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "hedges": self.hedges,
+                "hedge_ratio": self.hedges / self.calls if self.calls else 0.0,
+                "credits": round(self._credits, 2),
+            }
+
+
+def spawn(fn, *args):
+    """在独立线程中执行 fn，返回 Future
+
+    不使用固定大小的线程池，避免大量会话同时调用时在池中排队。
+    """
+    future = Future()
+
+    def run():
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            future.set_result(fn(*args))
+        except BaseException as e:
+            future.set_exception(e)
+
+    threading.Thread(target=run, daemon=True).start()
+    return future
+
+
+def hedged_call(primary, secondary, delay, budget, discard=None):
+    """带对冲的调用
+
+    primary / secondary 均为接收 cancel_event 参数的可调用对象，
+    失败时抛出异常，被取消时应尽快抛出 HedgeCancelled。
+
+    - primary 在 delay 秒内完成（成功或失败）时直接返回其结果或抛出其异常
+    - 否则在预算允许时并发启动 secondary，取先成功者，并取消另一方；
+      落败方若已产生结果，交给 discard 回调释放资源
+    - 两方都失败时抛出 primary 的异常
+
+    返回 (result, hedged)，hedged 表示结果是否来自 secondary。
+    """
+    budget.record_call()
+    primary_cancel = threading.Event()
+    primary_future = spawn(primary, primary_cancel)
+    done, _ = wait([primary_future], timeout=delay)
+    if done or not budget.try_acquire():
+        return primary_future.result(), False
+
+    logger.info(f"主模型 {delay:.1f}s 内未返回，启动对冲请求")
+    secondary_cancel = threading.Event()
+    secondary_future = spawn(secondary, secondary_cancel)
+    cancels = {primary_future: primary_cancel, secondary_future: secondary_cancel}
+    pending = set(cancels)
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            if future.exception() is not None:
+                continue
+            for loser in pending:
+                cancels[loser].set()
+                loser.add_done_callback(lambda f: _discard(f, discard))
+            return future.result(), future is secondary_future
+    raise primary_future.exception()
+
+
+def _discard(future, discard):
+    """释放落败方已经产生的结果（例如关闭流式连接）"""
+    if discard is None or future.exception() is not None:
+        return
+    try:
+        discard(future.result())
+    except Exception as e:
+        logger.warning(f"释放对冲落败结果失败: {str(e)}")
+
+
+_budget = None
+_budget_lock = threading.Lock()
+
+
+def get_hedge_budget():
+    """获取进程内共享的对冲预算"""
+    global _budget
+    if _budget is None:
+        with _budget_lock:
+            if _budget is None:
+                _budget = HedgeBudget(HEDGE_MAX_EXTRA_RATIO, HEDGE_BUDGET_BURST)
+    return _budget
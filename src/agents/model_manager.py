@@ -1,15 +1,40 @@
-import groq
-import streamlit as st
 import logging
+import math
 import time
 
+from agents.analysis_stream import AnalysisStream
+from agents.client_registry import get_client_registry
+from agents.response_cache import get_response_cache, make_response_key
+from agents.resilience import (
+    RATE_LIMITED,
+    FATAL,
+    classify_error,
+    get_retry_after,
+    backoff_delay,
+    get_breaker_board,
+)
+from agents.model_router import get_model_router
+from agents.hedging import HedgeCancelled, hedged_call, get_hedge_budget
+from agents.single_flight import get_single_flight, make_flight_key
+from agents.token_budget import estimate_request_tokens, get_token_accounting, MESSAGE_OVERHEAD_TOKENS
+from config.app_config import (
+    MODEL_MAX_RETRIES,
+    MODEL_BACKOFF_MAX_SECONDS,
+    HEDGE_ENABLED,
+    HEDGE_LATENCY_PERCENTILE,
+    HEDGE_MIN_SAMPLES,
+    HEDGE_DEFAULT_DELAY_SECONDS,
+    TOKEN_ESTIMATE_MARGIN,
+)
+from utils.token_estimator import estimate_tokens, fit_to_budget
+
 logger = logging.getLogger(__name__)
 
 class ModelManager:
     """模型管理器
 
     负责选择具体使用的大模型、在失败时自动降级重试，
-    同时在内部做简单的速率控制与重试逻辑。
+    并通过进程级熔断器在所有会话间共享各模型的健康状态。
     """
 
     MODELS = [
@@ -18,6 +43,20 @@ class ModelManager:
         "llama-3.1-8b-instant",
         "llama3-70b-8192",
     ]
+    # 各模型的输出质量评分 (0~1)，路由时低于 MODEL_QUALITY_FLOOR 的模型不参与
+    MODEL_QUALITY = {
+        "meta-llama/llama-4-maverick-17b-128e-instruct": 0.95,
+        "llama-3.3-70b-versatile": 0.9,
+        "llama3-70b-8192": 0.8,
+        "llama-3.1-8b-instant": 0.6,
+    }
+    # 各模型的上下文窗口 (token)，输入与输出合计不能超过该值
+    MODEL_CONTEXT_WINDOWS = {
+        "meta-llama/llama-4-maverick-17b-128e-instruct": 131072,
+        "llama-3.3-70b-versatile": 131072,
+        "llama-3.1-8b-instant": 131072,
+        "llama3-70b-8192": 8192,
+    }
     MAX_TOKENS = 2000
     TEMPERATURE = 0.7
 
@@ -31,68 +70,395 @@ class ModelManager:
         self._initialize_clients()
 
     def _initialize_clients(self):
-        """初始化各个模型提供商的 API 客户端"""
+        """获取各个模型提供商的 API 客户端
+
+        客户端来自进程级注册表，所有会话共享同一个连接池。
+        """
         try:
-            # 使用 Streamlit 的 secrets 配置初始化 Groq 客户端
-            self.clients["groq"] = groq.Groq(api_key=st.secrets["GROQ_API_KEY"])
+            self.clients["groq"] = get_client_registry().get_client("groq")
         except Exception as e:
             # 初始化失败只记录日志，不直接中断整个应用
             logger.error(f"初始化 Groq 客户端失败: {str(e)}")
 
-    def generate_analysis(self, data, system_prompt, retry_count=0):
-        """使用当前可用的最优模型生成分析结果
+    @staticmethod
+    def _format_user_content(data):
+        """将待分析数据转换为发送给模型的纯文本
+
+        直接使用 str(dict) 会把换行转义成字面量并带上引号与括号，
+        这里按“字段名、换行、内容”拼接，仅有 report 字段时直接发送报告正文。
+        """
+        if isinstance(data, dict):
+            if set(data) == {"report"}:
+                return str(data["report"])
+            return "\n\n".join(f"{key}:\n{value}" for key, value in data.items())
+        return str(data)
+
+    @classmethod
+    def _iter_stream_content(cls, completion_stream, cancel_event=None, usage=None):
+        """从流式响应中逐段取出非空文本内容，结束或中止时关闭底层连接
 
-        会根据重试次数在 "MODELS" 列表中依次降级选择模型，
-        并在遇到速率限制等错误时自动等待后重试。
+        cancel_event 被设置时抛出 HedgeCancelled；
+        传入 usage 字典时，写入服务端在最后一段附带的 token 用量。
         """
-        # 如果重试次数超过 3 次，直接认为所有模型均不可用
-        if retry_count > 3:
-            return {"success": False, "error": "All models failed after multiple retries"}
+        try:
+            for chunk in completion_stream:
+                if cancel_event is not None and cancel_event.is_set():
+                    raise HedgeCancelled()
+                if usage is not None:
+                    chunk_usage = cls._extract_usage(getattr(chunk, "x_groq", None))
+                    if chunk_usage:
+                        usage.update(chunk_usage)
+                if not chunk.choices:
+                    continue
+                text = chunk.choices[0].delta.content
+                if text:
+                    yield text
+        finally:
+            close = getattr(completion_stream, "close", None)
+            if close:
+                close()
+
+    @staticmethod
+    def _cached_result(cached, stream):
+        """将缓存内容包装成与实时调用一致的返回结构"""
+        content, model_used = cached
+        result = {"success": True, "model_used": model_used, "cached": True}
+        if stream:
+            result["stream"] = AnalysisStream(content, iter(()), model_used)
+        else:
+            result["content"] = content
+        return result
+
+    @staticmethod
+    def _cache_stream(cache, cache_key, analysis_stream):
+        """流式输出完整结束后写入缓存，中断的结果不缓存"""
+        if cache is not None and analysis_stream.completed and analysis_stream.content:
+            cache.set(cache_key, analysis_stream.content, analysis_stream.model_used)
+
+    def generate_analysis(self, data, system_prompt, stream=False):
+        """生成分析结果，相同请求并发时只调用一次模型
+
+        报告内容（规范化后）与提示词相同的并发调用共享同一次模型调用的结果，
+        流式模式下各调用方都能从头逐段读取同一份输出，见 agents.single_flight。
+        """
+        key = make_flight_key(self._format_user_content(data), system_prompt, stream)
+        return get_single_flight().do(key, lambda: self._generate_analysis(data, system_prompt, stream))
+
+    def _generate_analysis(self, data, system_prompt, stream=False):
+        """使用当前可用的最优模型生成分析结果
+
+        按路由器根据实时延迟、错误率与质量分给出的顺序依次尝试 "MODELS"，
+        跳过处于熔断冷却期的模型；
+        同一模型的临时错误按指数退避（带抖动、遵循 Retry-After）重试，
+        超过重试次数或遇到不可重试的错误时降级到下一个模型。
+
+        开启 HEDGE_ENABLED 时，若主模型在其近期延迟分位数内仍未返回，
+        会并发请求下一个候选模型，采用先成功的结果并取消另一方。
+
+        stream 为 True 时以流式方式调用模型：读到首个 token 后即返回，
+        结果中的 "stream" 为 AnalysisStream，可逐段渲染；
+        首个 token 之前的失败仍会按 MODELS 顺序降级。
 
-        # 根据当前重试次数选择要使用的模型下标
-        index = retry_count if retry_count < len(self.MODELS) else len(self.MODELS) - 1
+        相同报告、提示词与模型参数的结果会被缓存，命中时不再调用模型。
+        """
         provider = "groq"  # 当前仅支持 Groq 提供商
-        model = self.MODELS[index]
 
         # 检查对应提供商的客户端是否已经初始化
         if provider not in self.clients:
             logger.error(f"未找到提供商客户端: {provider}")
-            # 尝试使用下一个模型
-            return self.generate_analysis(data, system_prompt, retry_count + 1)
+            return {"success": False, "error": "Analysis failed with all available models"}
+
+        router = get_model_router()
+        candidates, user_content, estimated_tokens = self._fit_context(
+            router.order(self.MODELS, self.MODEL_QUALITY),
+            system_prompt,
+            self._format_user_content(data),
+        )
+        if not candidates:
+            return {"success": False, "error": "Report is too large for the available models"}
+        cache = get_response_cache()
+        board = get_breaker_board()
+        skipped = []
+
+        if cache is not None:
+            # 任一候选模型已有结果即可复用，不受本次路由顺序影响
+            cached = cache.get_any(
+                [self._cache_key(user_content, system_prompt, model) for model in candidates]
+            )
+            if cached:
+                logger.info(f"模型 {cached[1]} 的分析结果命中缓存")
+                return self._cached_result(cached, stream)
 
+        for index, model in enumerate(candidates):
+            cache_key = self._cache_key(user_content, system_prompt, model)
+            breaker = board.get(model)
+            for attempt in range(MODEL_MAX_RETRIES + 1):
+                if not breaker.allow_request():
+                    # 熔断冷却期内（其他会话刚触发过限流/故障），直接跳过
+                    skipped.append(model)
+                    logger.info(f"模型 {model} 处于熔断冷却期，跳过")
+                    break
+
+                # 只在首次尝试时对冲，重试阶段已经付出了等待成本
+                partner = self._hedge_partner(candidates[index + 1:]) if attempt == 0 else None
+                try:
+                    logger.info(f"尝试使用提供商 {provider} 的模型 {model} 生成分析")
+                    if partner:
+                        return self._hedged_attempt(
+                            provider, model, partner, system_prompt, user_content, stream, cache,
+                            estimated_tokens,
+                        )
+                    return self._attempt(
+                        provider, model, system_prompt, user_content, stream, cache, cache_key,
+                        estimated_tokens,
+                    )
+                except Exception as e:
+                    kind = classify_error(e)
+                    if kind == FATAL or attempt >= MODEL_MAX_RETRIES:
+                        break
+                    delay = backoff_delay(attempt, get_retry_after(e))
+                    if delay > MODEL_BACKOFF_MAX_SECONDS or breaker.remaining_cooldown() > delay:
+                        # 服务端要求等待过久，或等待结束时熔断器仍在冷却（重试必然被跳过），
+                        # 不如直接降级到下一个模型
+                        break
+                    time.sleep(delay)
+
+        if skipped and len(skipped) == len(candidates):
+            return {"success": False, "error": "All models are cooling down after recent failures, please retry shortly"}
+        return {"success": False, "error": "All models failed after multiple retries"}
+
+    def _required_tokens(self, model, estimated_tokens):
+        """按校准系数与安全余量计算调用该模型所需的上下文长度"""
+        calibration = get_token_accounting().calibration(model)
+        return math.ceil(estimated_tokens * calibration * (1 + TOKEN_ESTIMATE_MARGIN)) + self.MAX_TOKENS
+
+    def _fits(self, model, estimated_tokens):
+        window = self.MODEL_CONTEXT_WINDOWS.get(model)
+        return window is None or self._required_tokens(model, estimated_tokens) <= window
+
+    def _fit_context(self, candidates, system_prompt, user_content):
+        """在调用前检查输入规模，跳过上下文窗口不足的模型
+
+        所有模型都放不下时，按窗口最大的模型压缩报告内容（去除空白与重复行，
+        优先保留分节标题与异常指标），再重新筛选。
+        返回 (可用模型列表, 实际发送的内容, 预估输入 token 数)。
+        """
+        estimated_tokens = estimate_request_tokens(system_prompt, user_content)
+        fitting = [model for model in candidates if self._fits(model, estimated_tokens)]
+        for model in candidates:
+            if model not in fitting:
+                logger.info(f"模型 {model} 上下文窗口不足（预估输入 {estimated_tokens} tokens），跳过")
+        if fitting:
+            return fitting, user_content, estimated_tokens
+
+        target = max(candidates, key=lambda model: self.MODEL_CONTEXT_WINDOWS.get(model, 0))
+        calibration = get_token_accounting().calibration(target)
+        budget = (
+            int((self.MODEL_CONTEXT_WINDOWS[target] - self.MAX_TOKENS) / (calibration * (1 + TOKEN_ESTIMATE_MARGIN)))
+            - estimate_tokens(system_prompt)
+            - 2 * MESSAGE_OVERHEAD_TOKENS
+        )
+        if budget <= 0:
+            logger.error("系统提示词已超出所有模型的上下文窗口")
+            return [], user_content, estimated_tokens
+
+        user_content, omitted = fit_to_budget(user_content, budget)
+        estimated_tokens = estimate_request_tokens(system_prompt, user_content)
+        logger.warning(f"报告内容过长，已压缩至约 {estimated_tokens} tokens（省略 {omitted} 行）")
+        fitting = [model for model in candidates if self._fits(model, estimated_tokens)]
+        return fitting, user_content, estimated_tokens
+
+    def _cache_key(self, user_content, system_prompt, model):
+        return make_response_key(
+            user_content, system_prompt, model, self.TEMPERATURE, self.MAX_TOKENS
+        )
+
+    def _attempt(self, provider, model, system_prompt, user_content, stream, cache, cache_key,
+                 estimated_tokens, cancel_event=None):
+        """调用一次指定模型，并把结果记入熔断器、路由器与 token 用量统计
+
+        失败时记录后重新抛出异常；被对冲取消时不计为失败。
+        只有限流与临时故障计入熔断器：FATAL（400、程序错误等）取决于请求或代码本身，
+        若计入，少数超长或格式错误的请求就会让所有会话都无法使用该模型。
+        """
+        breaker = get_breaker_board().get(model)
+        router = get_model_router()
+        started = time.perf_counter()
         try:
-            client = self.clients[provider]
-            logger.info(f"尝试使用提供商 {provider} 的模型 {model} 生成分析")
-
-            if provider == "groq":
-                # 调用 Groq Chat Completions 接口生成内容
-                completion = client.chat.completions.create(
-                    model=model,
-                    messages=[
-                        {"role": "system", "content": system_prompt},  # 系统提示，控制整体风格
-                        {"role": "user", "content": str(data)}         # 用户消息，传入体检数据
-                    ],
-                    temperature=self.TEMPERATURE,
-                    max_tokens=self.MAX_TOKENS,
-                )
-
-                # 返回调用成功的结果和使用的模型名称
-                return {
-                    "success": True,
-                    "content": completion.choices[0].message.content,
-                    "model_used": f"{provider}/{model}"
-                }
-                
+            result = self._call_model(
+                provider, model, system_prompt, user_content, stream, cache, cache_key, cancel_event
+            )
+        except HedgeCancelled:
+            breaker.release_probe()
+            raise
         except Exception as e:
-            error_message = str(e).lower()
-            logger.warning(f"模型 {model} 调用失败: {error_message}")
+            router.record_failure(model, time.perf_counter() - started)
+            kind = classify_error(e)
+            retry_after = get_retry_after(e)
+            logger.warning(f"模型 {model} 调用失败 ({kind}): {str(e)}")
+
+            if kind == FATAL:
+                breaker.release_probe()
+                raise
+            cooldown = retry_after
+            if kind == RATE_LIMITED and cooldown is None:
+                cooldown = MODEL_BACKOFF_MAX_SECONDS
+            breaker.record_failure(cooldown)
+            raise
+
+        breaker.record_success()
+        if stream:
+            router.record_first_token(model, time.perf_counter() - started)
+        self._record_route_metrics(router, model, started, result)
+        self._record_token_usage(model, estimated_tokens, result)
+        return result
+
+    @staticmethod
+    def _hedge_partner(remaining):
+        """选出可用于对冲的下一个候选模型
+
+        只选择熔断器处于 closed 状态的模型，避免对冲请求占用半开探测名额。
+        """
+        if not HEDGE_ENABLED:
+            return None
+        board = get_breaker_board()
+        for model in remaining:
+            if board.get(model).state == "closed":
+                return model
+        return None
+
+    def _hedged_attempt(self, provider, model, partner, system_prompt, user_content, stream, cache,
+                        estimated_tokens):
+        """对主模型发起调用，超过其延迟分位数仍未返回时并发调用 partner
+
+        流式模式下以首个 token 的到达时间作为“返回”的判断标准。
+        """
+        router = get_model_router()
+        delay = router.latency_percentile(
+            model, HEDGE_LATENCY_PERCENTILE, first_token=stream, min_samples=HEDGE_MIN_SAMPLES
+        )
+        if delay is None:
+            delay = HEDGE_DEFAULT_DELAY_SECONDS
+
+        def call(target):
+            cache_key = self._cache_key(user_content, system_prompt, target)
+            return lambda cancel_event: self._attempt(
+                provider, target, system_prompt, user_content, stream, cache, cache_key,
+                estimated_tokens, cancel_event,
+            )
+
+        result, hedged = hedged_call(
+            call(model), call(partner), delay, get_hedge_budget(), discard=self._discard_result
+        )
+        if hedged:
+            logger.info(f"对冲请求胜出：使用模型 {partner} 替代 {model}")
+        return result
+
+    @staticmethod
+    def _discard_result(result):
+        """对冲落败方已经开始输出时，关闭其流式连接"""
+        analysis_stream = result.get("stream")
+        if analysis_stream is not None:
+            analysis_stream.close()
+
+    def _call_model(self, provider, model, system_prompt, user_content, stream, cache, cache_key,
+                    cancel_event=None):
+        """调用一次指定模型，失败时直接抛出异常交由上层处理
+
+        传入 cancel_event 时始终以流式方式请求，以便在被对冲取消后及时断开连接。
+        """
+        client = self.clients[provider]
+        # 调用 Groq Chat Completions 接口生成内容
+        completion = client.chat.completions.create(
+            model=model,
+            messages=[
+                {"role": "system", "content": system_prompt},  # 系统提示，控制整体风格
+                {"role": "user", "content": user_content},  # 用户消息，传入体检数据
+            ],
+            temperature=self.TEMPERATURE,
+            max_tokens=self.MAX_TOKENS,
+            stream=stream or cancel_event is not None,
+        )
+
+        if stream:
+            # 先读取首段内容，确认该模型已开始输出后再交给调用方
+            usage = {}
+            chunks = self._iter_stream_content(completion, cancel_event, usage)
+            first_chunk = next(chunks, "")
+            if not first_chunk:
+                raise ValueError("模型未返回任何内容")
+            analysis_stream = AnalysisStream(
+                first_chunk,
+                chunks,
+                f"{provider}/{model}",
+                on_complete=lambda s: self._cache_stream(cache, cache_key, s),
+            )
+            analysis_stream.usage = usage  # 服务端在最后一段附带用量，结束后才会填充
+            return {
+                "success": True,
+                "stream": analysis_stream,
+                "model_used": f"{provider}/{model}"
+            }
+
+        if cancel_event is not None:
+            usage = {}
+            content = "".join(self._iter_stream_content(completion, cancel_event, usage))
+            usage = usage or None
+        else:
+            content = completion.choices[0].message.content
+            usage = self._extract_usage(completion)
+        if cache is not None and content:
+            cache.set(cache_key, content, f"{provider}/{model}")
+
+        # 返回调用成功的结果和使用的模型名称
+        return {
+            "success": True,
+            "content": content,
+            "model_used": f"{provider}/{model}",
+            "usage": usage,
+        }
+
+    @staticmethod
+    def _extract_usage(completion):
+        """读取响应（或流式响应附带的 x_groq 字段）中的 token 用量，没有时返回 None"""
+        usage = getattr(completion, "usage", None)
+        if usage is None:
+            return None
+        return {
+            "prompt_tokens": getattr(usage, "prompt_tokens", 0) or 0,
+            "completion_tokens": getattr(usage, "completion_tokens", 0) or 0,
+        }
+
+    @staticmethod
+    def _record_route_metrics(router, model, started, result):
+        """将本次调用的耗时与吞吐写入路由器
+
+        流式调用在输出完整结束后才记录，保证与非流式调用的耗时口径一致。
+        """
+        analysis_stream = result.get("stream")
+        if analysis_stream is None:
+            usage = result.get("usage") or {}
+            router.record_success(model, time.perf_counter() - started, usage.get("completion_tokens"))
+            return
 
-            # 如果是速率限制或配额相关错误，稍作等待再重试
-            if "rate limit" in error_message or "quota" in error_message:
-                time.sleep(2)
+        def on_done(finished):
+            latency = time.perf_counter() - started
+            if finished.completed:
+                router.record_success(model, latency, estimate_tokens(finished.content))
+            else:
+                router.record_failure(model, latency)
 
-            # 递归调用自身，尝试使用下一个模型
-            return self.generate_analysis(data, system_prompt, retry_count + 1)
+        analysis_stream.add_done_callback(on_done)
 
-        # 正常情况下不会到达这里，作为兜底错误返回
-        return {"success": False, "error": "Analysis failed with all available models"}
+    @staticmethod
+    def _record_token_usage(model, estimated_tokens, result):
+        """记录本次调用的预估与实际 token 用量，流式调用在输出结束后记录"""
+        accounting = get_token_accounting()
+        result["estimated_prompt_tokens"] = estimated_tokens
+        analysis_stream = result.get("stream")
+        if analysis_stream is None:
+            accounting.record(model, estimated_tokens, result.get("usage"))
+            return
+        analysis_stream.add_done_callback(
+            lambda finished: accounting.record(model, estimated_tokens, finished.usage or None)
+        )
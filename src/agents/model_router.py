@@ -0,0 +1,172 @@
+import threading
+import time
+from collections import deque
+
+from config.app_config import (
+    MODEL_QUALITY_FLOOR,
+    ROUTER_EWMA_ALPHA,
+    ROUTER_ERROR_PENALTY,
+    ROUTER_PRIOR_LATENCY_SECONDS,
+    ROUTER_DECAY_HALF_LIFE_SECONDS,
+)
+
+LATENCY_WINDOW = 200  # 每个模型保留的最近延迟样本数，用于计算分位数
+
+
+class ModelStats:
+    """单个模型的实时指标（EWMA 平滑）"""
+
+    def __init__(self, prior_latency):
+        self.prior_latency = prior_latency
+        self.ewma_latency = prior_latency
+        self.ewma_error_rate = 0.0
+        self.ewma_tokens_per_sec = None
+        self.calls = 0
+        self.errors = 0
+        self.last_updated = None
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+        self.first_token_latencies = deque(maxlen=LATENCY_WINDOW)
+
+    def decayed(self, now, half_life):
+        """返回随时间向先验值回归后的 (延迟, 错误率)
+
+        长时间未被调用的模型（例如因故障被降级）会逐渐恢复评分，
+        从而有机会被重新尝试，而不是永远排在末尾。
+        """
+        if self.last_updated is None:
+            return self.prior_latency, 0.0
+        weight = 0.5 ** ((now - self.last_updated) / half_life) if half_life else 1.0
+        latency = self.prior_latency + (self.ewma_latency - self.prior_latency) * weight
+        return latency, self.ewma_error_rate * weight
+
+
+class ModelRouter:
+    """基于延迟与错误率的自适应模型路由
+
+    每次调用前根据各模型的 EWMA 延迟、错误率与质量分对候选模型排序；
+    质量分低于 MODEL_QUALITY_FLOOR 的模型不会参与路由。
+    质量分由调用方传入（见 ModelManager.MODEL_QUALITY），未配置的模型按 1.0 计。
+    """
+
+    def __init__(self, quality_floor=0.0, alpha=0.3, error_penalty=4.0,
+                 prior_latency=10.0, decay_half_life=300.0):
+        self.quality_floor = quality_floor
+        self.alpha = alpha
+        self.error_penalty = error_penalty
+        self.prior_latency = prior_latency
+        self.decay_half_life = decay_half_life
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def _get_stats(self, model):
+        stats = self._stats.get(model)
+        if stats is None:
+            stats = self._stats[model] = ModelStats(self.prior_latency)
+        return stats
+
+    def score(self, model, quality=None, now=None):
+        """模型的期望代价，越低越优先"""
+        now = now or time.time()
+        with self._lock:
+            latency, error_rate = self._get_stats(model).decayed(now, self.decay_half_life)
+        model_quality = (quality or {}).get(model, 1.0) or 1e-6
+        return latency * (1 + self.error_penalty * error_rate) / model_quality
+
+    def order(self, models, quality=None):
+        """按当前评分对候选模型排序（保持稳定：同分时沿用原有优先级）"""
+        quality = quality or {}
+        eligible = [m for m in models if quality.get(m, 1.0) >= self.quality_floor]
+        if not eligible:
+            eligible = list(models)  # 全部低于质量下限时退回完整列表，保证可用
+        now = time.time()
+        scores = {model: self.score(model, quality, now) for model in eligible}
+        return sorted(eligible, key=lambda model: scores[model])
+
+    def record_success(self, model, latency, completion_tokens=None):
+        with self._lock:
+            stats = self._get_stats(model)
+            self._update(stats, latency, error=0.0)
+            if completion_tokens and latency > 0:
+                tokens_per_sec = completion_tokens / latency
+                if stats.ewma_tokens_per_sec is None:
+                    stats.ewma_tokens_per_sec = tokens_per_sec
+                else:
+                    stats.ewma_tokens_per_sec += self.alpha * (tokens_per_sec - stats.ewma_tokens_per_sec)
+
+    def record_failure(self, model, latency):
+        with self._lock:
+            stats = self._get_stats(model)
+            stats.errors += 1
+            self._update(stats, latency, error=1.0)
+
+    def record_first_token(self, model, latency):
+        """记录流式调用的首个 token 耗时"""
+        with self._lock:
+            self._get_stats(model).first_token_latencies.append(latency)
+
+    def _update(self, stats, latency, error):
+        now = time.time()
+        # 先按衰减后的值作为基线，再融合新样本
+        base_latency, base_error = stats.decayed(now, self.decay_half_life)
+        stats.ewma_latency = base_latency + self.alpha * (latency - base_latency)
+        stats.ewma_error_rate = base_error + self.alpha * (error - base_error)
+        stats.calls += 1
+        stats.last_updated = now
+        stats.latencies.append(latency)
+
+    def latency_percentile(self, model, percentile, first_token=False, min_samples=1):
+        """返回模型最近延迟样本的分位数
+
+        first_token 为 True 时使用流式调用的首 token 耗时；
+        样本数少于 min_samples 时返回 None。
+        """
+        with self._lock:
+            stats = self._get_stats(model)
+            samples = sorted(stats.first_token_latencies if first_token else stats.latencies)
+        if not samples or len(samples) < min_samples:
+            return None
+        index = min(len(samples) - 1, int(round(percentile * (len(samples) - 1))))
+        return samples[index]
+
+    def snapshot(self, models=None, quality=None):
+        """返回实时评分板，便于运维查看"""
+        quality = quality or {}
+        now = time.time()
+        with self._lock:
+            names = list(models or self._stats.keys())
+            rows = []
+            for model in names:
+                stats = self._get_stats(model)
+                latency, error_rate = stats.decayed(now, self.decay_half_life)
+                rows.append({
+                    "model": model,
+                    "quality": quality.get(model, 1.0),
+                    "ewma_latency_s": round(latency, 2),
+                    "error_rate": round(error_rate, 3),
+                    "tokens_per_sec": round(stats.ewma_tokens_per_sec, 1) if stats.ewma_tokens_per_sec else None,
+                    "calls": stats.calls,
+                    "errors": stats.errors,
+                })
+        for row in rows:
+            row["score"] = round(self.score(row["model"], quality, now), 2)
+        return sorted(rows, key=lambda row: row["score"])
+
+
+_router = None
+_router_lock = threading.Lock()
+
+
+def get_model_router():
+    """获取进程内共享的模型路由器"""
+    global _router
+    if _router is None:
+        with _router_lock:
+            if _router is None:
+                _router = ModelRouter(
+                    quality_floor=MODEL_QUALITY_FLOOR,
+                    alpha=ROUTER_EWMA_ALPHA,
+                    error_penalty=ROUTER_ERROR_PENALTY,
+                    prior_latency=ROUTER_PRIOR_LATENCY_SECONDS,
+                    decay_half_life=ROUTER_DECAY_HALF_LIFE_SECONDS,
+                )
+    return _router
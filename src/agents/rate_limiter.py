@@ -0,0 +1,229 @@
+import json
+import logging
+import math
+import os
+import sqlite3
+import threading
+import time
+
+from config.app_config import (
+    ANALYSIS_DAILY_LIMIT,
+    RATE_LIMIT_WINDOW_SECONDS,
+    RATE_LIMIT_BURST,
+    RATE_LIMIT_REFILL_SECONDS,
+    RATE_LIMIT_BACKEND,
+    RATE_LIMIT_DB_PATH,
+)
+
+logger = logging.getLogger(__name__)
+
+_EPSILON = 1e-6  # 吸收浮点误差：按返回的等待时间重试时应当被放行
+
+
+class MemoryRateLimitStore:
+    """进程内计数器存储，适用于单进程部署"""
+
+    def __init__(self):
+        self._states = {}
+        self._lock = threading.Lock()
+
+    def update(self, key, fn):
+        """原子地读取并更新 key 的状态；fn(state) 返回 (新状态或 None, 结果)"""
+        with self._lock:
+            state, result = fn(self._states.get(key))
+            if state is not None:
+                self._states[key] = state
+            return result
+
+
+class SqliteRateLimitStore:
+    """基于 SQLite 的计数器存储，同一主机上的多个服务进程共享计数
+
+    每次检查只读写一行，在 BEGIN IMMEDIATE 事务中完成，保证并发下的原子性。
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS rate_limit ("
+                " key TEXT PRIMARY KEY,"
+                " state TEXT NOT NULL,"
+                " updated_at REAL NOT NULL)"
+            )
+
+    def _connect(self):
+        return sqlite3.connect(self.db_path, timeout=10, isolation_level=None)
+
+    def update(self, key, fn):
+        """原子地读取并更新 key 的状态；fn(state) 返回 (新状态或 None, 结果)"""
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute("SELECT state FROM rate_limit WHERE key = ?", (key,)).fetchone()
+            state, result = fn(json.loads(row[0]) if row else None)
+            if state is not None:
+                conn.execute(
+                    "INSERT OR REPLACE INTO rate_limit (key, state, updated_at) VALUES (?, ?, ?)",
+                    (key, json.dumps(state), time.time()),
+                )
+            conn.execute("COMMIT")
+            return result
+        except Exception:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+
+class RateLimiter:
+    """按用户限制分析次数：滑动窗口计数 + 令牌桶
+
+    - 滑动窗口：用“上一窗口计数 × 剩余比例 + 当前窗口计数”近似滑动窗口，
+      每个用户只保存两个计数，检查为 O(1)
+    - 令牌桶：限制短时间内的连续请求，避免单个用户瞬间占满共享配额
+    两者都允许时才会消耗额度，拒绝时返回精确的可重试等待秒数。
+    """
+
+    def __init__(self, store, limit, window_seconds, burst, refill_seconds):
+        self.store = store
+        self.limit = limit
+        self.window = window_seconds
+        self.burst = burst
+        self.refill_seconds = refill_seconds
+
+    def check(self, user_id, consume=True, now=None):
+        """检查用户是否可以再分析一次
+
+        consume 为 False 时只检查不计数（用于提交前的预检）。
+        返回 (是否允许, 需要等待的秒数)。
+        """
+        now = now or time.time()
+
+        def apply(state):
+            window_start, current, previous, tokens, updated = self._advance(state, now)
+            retry_after = max(
+                self._window_retry_after(now - window_start, current, previous),
+                self._bucket_retry_after(tokens),
+            )
+            if retry_after > 0:
+                return None, (False, retry_after)
+            if not consume:
+                return None, (True, 0.0)
+            return {
+                "window_start": window_start,
+                "current": current + 1,
+                "previous": previous,
+                "tokens": max(0.0, tokens - 1),
+                "updated": now,
+            }, (True, 0.0)
+
+        return self.store.update(f"analysis:{user_id}", apply)
+
+    def refund(self, user_id, consumed_at, now=None):
+        """退还一次在 consumed_at 时计入的分析（例如分析最终失败）
+
+        从计入时所在的窗口扣回计数，并补回一个令牌；该窗口已滚出统计范围时只补令牌。
+        """
+        now = now or time.time()
+
+        def apply(state):
+            if not state:
+                return None, None
+            window_start, current, previous, tokens, updated = self._advance(state, now)
+            if consumed_at >= window_start:
+                current = max(0, current - 1)
+            elif consumed_at >= window_start - self.window:
+                previous = max(0, previous - 1)
+            return {
+                "window_start": window_start,
+                "current": current,
+                "previous": previous,
+                "tokens": min(float(self.burst), tokens + 1),
+                "updated": updated,
+            }, None
+
+        self.store.update(f"analysis:{user_id}", apply)
+
+    def _advance(self, state, now):
+        """把状态推进到 now：滚动窗口并补充令牌"""
+        if not state:
+            window_start = now - (now % self.window)
+            return window_start, 0, 0, float(self.burst), now
+        window_start, current, previous = state["window_start"], state["current"], state["previous"]
+        elapsed_windows = int((now - window_start) // self.window)
+        if elapsed_windows >= 1:
+            previous = current if elapsed_windows == 1 else 0
+            current = 0
+            window_start += elapsed_windows * self.window
+        tokens = min(
+            float(self.burst),
+            state["tokens"] + (now - state["updated"]) / self.refill_seconds,
+        )
+        return window_start, current, previous, tokens, now
+
+    def _window_retry_after(self, elapsed, current, previous):
+        """滑动窗口估计值降到 limit - 1 以下还需等待的秒数"""
+        def weighted(prev_count, curr_count, offset):
+            return prev_count * (1 - offset / self.window) + curr_count
+
+        if weighted(previous, current, elapsed) + 1 <= self.limit + _EPSILON:
+            return 0.0
+        if current + 1 <= self.limit and previous:
+            # 在当前窗口内等待上一窗口的权重衰减
+            wait = (weighted(previous, current, elapsed) + 1 - self.limit) / previous * self.window
+            if elapsed + wait <= self.window:
+                return wait
+        # 当前窗口已满：等到下一窗口，当前计数成为“上一窗口”并逐渐衰减
+        until_next = self.window - elapsed
+        if current + 1 <= self.limit:
+            return until_next
+        return until_next + self.window * (1 - (self.limit - 1) / current)
+
+    def _bucket_retry_after(self, tokens):
+        if tokens >= 1 - _EPSILON:
+            return 0.0
+        return (1 - tokens) * self.refill_seconds
+
+
+def format_retry_after(seconds):
+    """将等待秒数格式化为便于阅读的中文描述"""
+    seconds = max(1, math.ceil(seconds))
+    hours, remainder = divmod(seconds, 3600)
+    minutes, secs = divmod(remainder, 60)
+    if hours:
+        return f"{hours} 小时 {minutes} 分钟" if minutes else f"{hours} 小时"
+    if minutes:
+        return f"{minutes} 分钟 {secs} 秒" if secs else f"{minutes} 分钟"
+    return f"{secs} 秒"
+
+
+_limiter = None
+_limiter_lock = threading.Lock()
+
+
+def get_rate_limiter():
+    """获取进程内共享的限流器（计数器按 RATE_LIMIT_BACKEND 存储）"""
+    global _limiter
+    if _limiter is None:
+        with _limiter_lock:
+            if _limiter is None:
+                store = None
+                if RATE_LIMIT_BACKEND == "sqlite" and RATE_LIMIT_DB_PATH:
+                    try:
+                        store = SqliteRateLimitStore(RATE_LIMIT_DB_PATH)
+                    except sqlite3.Error as e:
+                        logger.error(f"初始化限流数据库失败，改用进程内计数: {str(e)}")
+                _limiter = RateLimiter(
+                    store or MemoryRateLimitStore(),
+                    limit=ANALYSIS_DAILY_LIMIT,
+                    window_seconds=RATE_LIMIT_WINDOW_SECONDS,
+                    burst=RATE_LIMIT_BURST,
+                    refill_seconds=RATE_LIMIT_REFILL_SECONDS,
+                )
+    return _limiter
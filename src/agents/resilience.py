@@ -0,0 +1,195 @@
+import email.utils
+import random
+import threading
+import time
+
+import groq
+
+from config.app_config import (
+    MODEL_BACKOFF_BASE_SECONDS,
+    MODEL_BACKOFF_MAX_SECONDS,
+    CIRCUIT_FAILURE_THRESHOLD,
+    CIRCUIT_COOLDOWN_SECONDS,
+)
+
+# 错误类别
+RATE_LIMITED = "rate_limited"  # 429：等待 Retry-After 或切换模型
+TRANSIENT = "transient"        # 超时、连接失败、5xx：退避后可重试同一模型
+FATAL = "fatal"                # 鉴权、参数、模型不存在及未知异常：重试无意义，直接切换模型
+
+
+def classify_error(exc):
+    """按异常类型（而非错误字符串）对模型调用失败进行分类
+
+    只有 429、连接失败、超时与 5xx 可重试；其他异常（包括 KeyError、TypeError
+    等程序错误）一律视为 FATAL，不重试也不计入熔断器，避免一个 bug 让所有用户的模型被熔断。
+    """
+    if isinstance(exc, groq.RateLimitError):
+        return RATE_LIMITED
+    if isinstance(exc, (groq.APITimeoutError, groq.APIConnectionError, groq.InternalServerError)):
+        return TRANSIENT
+    if isinstance(exc, groq.APIStatusError):
+        status = getattr(exc, "status_code", None)
+        if status == 429:
+            return RATE_LIMITED
+        if status is not None and status >= 500:
+            return TRANSIENT
+    return FATAL
+
+
+def get_retry_after(exc):
+    """从响应头中解析服务端建议的等待秒数，没有时返回 None"""
+    response = getattr(exc, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+
+    retry_after_ms = headers.get("retry-after-ms")
+    if retry_after_ms:
+        try:
+            return max(0.0, float(retry_after_ms) / 1000)
+        except ValueError:
+            pass
+
+    retry_after = headers.get("retry-after")
+    if not retry_after:
+        return None
+    try:
+        return max(0.0, float(retry_after))
+    except ValueError:
+        pass
+    try:
+        # 也可能是 HTTP 日期格式
+        parsed = email.utils.parsedate_to_datetime(retry_after)
+    except (TypeError, ValueError):
+        return None
+    if parsed is None:
+        return None
+    return max(0.0, parsed.timestamp() - time.time())
+
+
+def backoff_delay(attempt, retry_after=None, base=MODEL_BACKOFF_BASE_SECONDS, cap=MODEL_BACKOFF_MAX_SECONDS):
+    """计算第 attempt 次重试前的等待时间
+
+    - 服务端给出 Retry-After 时以其为准，再加少量抖动避免所有会话同时醒来
+    - 否则使用带完全抖动（full jitter）的指数退避
+    """
+    if retry_after is not None:
+        return retry_after + random.uniform(0, base)
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+class CircuitBreaker:
+    """单个模型的熔断器
+
+    - closed：正常放行
+    - open：冷却期内直接跳过该模型
+    - half-open：冷却结束后只放行一个探测请求，成功则恢复，失败则再次熔断
+    """
+
+    def __init__(self, failure_threshold=3, cooldown_seconds=30.0):
+        self.failure_threshold = failure_threshold
+        self.cooldown_seconds = cooldown_seconds
+        self._lock = threading.Lock()
+        self.consecutive_failures = 0
+        self.open_until = 0.0
+        self._probe_in_flight = False
+        self.total_failures = 0
+        self.total_successes = 0
+
+    @property
+    def state(self):
+        if self.open_until > time.time():
+            return "open"
+        if self.open_until:
+            return "half_open"
+        return "closed"
+
+    def allow_request(self):
+        """判断当前是否可以调用该模型"""
+        with self._lock:
+            now = time.time()
+            if self.open_until > now:
+                return False
+            if self.open_until:
+                # 冷却已结束：只允许一个探测请求通过
+                if self._probe_in_flight:
+                    return False
+                self._probe_in_flight = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self.consecutive_failures = 0
+            self.open_until = 0.0
+            self._probe_in_flight = False
+            self.total_successes += 1
+
+    def record_failure(self, cooldown=None):
+        """记录一次失败；cooldown 为服务端要求的等待时间（如 Retry-After）"""
+        with self._lock:
+            self.consecutive_failures += 1
+            self.total_failures += 1
+            self._probe_in_flight = False
+            now = time.time()
+            if cooldown is not None:
+                self.open_until = max(self.open_until, now + cooldown)
+            elif self.open_until or self.consecutive_failures >= self.failure_threshold:
+                # 半开探测失败或连续失败达到阈值时熔断
+                self.open_until = now + self.cooldown_seconds
+
+    def release_probe(self):
+        """请求被主动取消（既非成功也非失败）时释放探测名额"""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def remaining_cooldown(self):
+        return max(0.0, self.open_until - time.time())
+
+
+class CircuitBreakerBoard:
+    """进程内所有会话共享的按模型熔断器集合"""
+
+    def __init__(self, failure_threshold=3, cooldown_seconds=30.0):
+        self.failure_threshold = failure_threshold
+        self.cooldown_seconds = cooldown_seconds
+        self._breakers = {}
+        self._lock = threading.Lock()
+
+    def get(self, model):
+        with self._lock:
+            breaker = self._breakers.get(model)
+            if breaker is None:
+                breaker = self._breakers[model] = CircuitBreaker(
+                    self.failure_threshold, self.cooldown_seconds
+                )
+            return breaker
+
+    def snapshot(self):
+        """返回各模型熔断状态，便于运维查看"""
+        with self._lock:
+            breakers = dict(self._breakers)
+        return {
+            model: {
+                "state": breaker.state,
+                "consecutive_failures": breaker.consecutive_failures,
+                "cooldown_remaining": round(breaker.remaining_cooldown(), 1),
+                "failures": breaker.total_failures,
+                "successes": breaker.total_successes,
+            }
+            for model, breaker in breakers.items()
+        }
+
+
+_board = None
+_board_lock = threading.Lock()
+
+
+def get_breaker_board():
+    """获取进程内共享的熔断器集合"""
+    global _board
+    if _board is None:
+        with _board_lock:
+            if _board is None:
+                _board = CircuitBreakerBoard(CIRCUIT_FAILURE_THRESHOLD, CIRCUIT_COOLDOWN_SECONDS)
+    return _board
@@ -0,0 +1,213 @@
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from config.app_config import (
+    RESPONSE_CACHE_ENABLED,
+    RESPONSE_CACHE_MAX_ENTRIES,
+    RESPONSE_CACHE_TTL_SECONDS,
+    RESPONSE_CACHE_DB_PATH,
+    RESPONSE_CACHE_DB_MAX_ENTRIES,
+)
+from config.prompts import PROMPT_VERSION
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_report_text(text):
+    """规范化报告文本：去掉多余空白与空行，使等价报告得到相同的缓存键"""
+    lines = (" ".join(line.split()) for line in str(text).splitlines())
+    return "\n".join(line for line in lines if line)
+
+
+def make_response_key(report_text, system_prompt, model, temperature, max_tokens):
+    """根据报告、提示词版本与模型参数计算缓存键
+
+    提示词版本由 PROMPT_VERSION 与提示词内容的哈希共同决定，
+    修改提示词后旧的缓存结果自动失效。
+    """
+    prompt_hash = hashlib.sha256(system_prompt.encode("utf-8")).hexdigest()[:16]
+    digest = hashlib.sha256()
+    for part in (PROMPT_VERSION, prompt_hash, model, temperature, max_tokens):
+        digest.update(str(part).encode("utf-8"))
+        digest.update(b"\0")
+    digest.update(normalize_report_text(report_text).encode("utf-8"))
+    return digest.hexdigest()
+
+
+class ResponseCache:
+    """模型响应缓存
+
+    - 内存层：LRU + TTL，进程内共享
+    - SQLite 层：持久化到本地文件，重启后仍然有效，多个进程可共享
+    """
+
+    def __init__(self, max_entries=256, ttl_seconds=7 * 24 * 3600, db_path=None, db_max_entries=5000):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.db_path = db_path
+        self.db_max_entries = db_max_entries
+        self._entries = OrderedDict()  # key -> (content, model_used, created_at)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.db_hits = 0
+        if db_path:
+            self._init_db()
+
+    def get(self, key):
+        """查询缓存，命中时返回 (content, model_used)，否则返回 None"""
+        return self.get_any([key])
+
+    def get_any(self, keys):
+        """依次查询多个键（例如同一请求在不同模型下的缓存），返回第一个命中的结果
+
+        整体只计一次命中或未命中。
+        """
+        for key in keys:
+            entry = self._lookup(key)
+            if entry:
+                with self._lock:
+                    self.hits += 1
+                return entry
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def _lookup(self, key):
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and now - entry[2] <= self.ttl_seconds:
+                self._entries.move_to_end(key)
+                return entry[0], entry[1]
+            if entry:
+                del self._entries[key]  # 已过期
+
+        entry = self._db_get(key, now)
+        if not entry:
+            return None
+        with self._lock:
+            self.db_hits += 1
+            self._store_memory(key, entry)
+        return entry[0], entry[1]
+
+    def set(self, key, content, model_used):
+        """写入缓存（内存与 SQLite 两层）"""
+        entry = (content, model_used, time.time())
+        with self._lock:
+            self._store_memory(key, entry)
+        self._db_set(key, entry)
+
+    def stats(self):
+        """返回缓存命中统计，用于监控"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "db_hits": self.db_hits,
+                "hit_rate": self.hits / total if total else 0.0,
+            }
+
+    def _store_memory(self, key, entry):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _connect(self):
+        return sqlite3.connect(self.db_path, timeout=10)
+
+    def _init_db(self):
+        try:
+            directory = os.path.dirname(self.db_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with self._connect() as conn:
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS response_cache ("
+                    " key TEXT PRIMARY KEY,"
+                    " content TEXT NOT NULL,"
+                    " model_used TEXT,"
+                    " created_at REAL NOT NULL,"
+                    " last_access REAL NOT NULL)"
+                )
+                conn.execute(
+                    "CREATE INDEX IF NOT EXISTS idx_response_cache_last_access"
+                    " ON response_cache(last_access)"
+                )
+        except sqlite3.Error as e:
+            logger.error(f"初始化响应缓存数据库失败: {str(e)}")
+            self.db_path = None
+
+    def _db_get(self, key, now):
+        if not self.db_path:
+            return None
+        try:
+            with self._connect() as conn:
+                row = conn.execute(
+                    "SELECT content, model_used, created_at FROM response_cache WHERE key = ?",
+                    (key,),
+                ).fetchone()
+                if not row:
+                    return None
+                if now - row[2] > self.ttl_seconds:
+                    conn.execute("DELETE FROM response_cache WHERE key = ?", (key,))
+                    return None
+                conn.execute("UPDATE response_cache SET last_access = ? WHERE key = ?", (now, key))
+                return row
+        except sqlite3.Error as e:
+            logger.warning(f"读取响应缓存失败: {str(e)}")
+            return None
+
+    def _db_set(self, key, entry):
+        if not self.db_path:
+            return
+        content, model_used, created_at = entry
+        try:
+            with self._connect() as conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO response_cache"
+                    " (key, content, model_used, created_at, last_access) VALUES (?, ?, ?, ?, ?)",
+                    (key, content, model_used, created_at, created_at),
+                )
+                # 清理过期条目，并按最近访问时间淘汰超出上限的部分
+                conn.execute(
+                    "DELETE FROM response_cache WHERE created_at < ?",
+                    (created_at - self.ttl_seconds,),
+                )
+                conn.execute(
+                    "DELETE FROM response_cache WHERE key IN ("
+                    " SELECT key FROM response_cache ORDER BY last_access DESC LIMIT -1 OFFSET ?)",
+                    (self.db_max_entries,),
+                )
+        except sqlite3.Error as e:
+            logger.warning(f"写入响应缓存失败: {str(e)}")
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_response_cache():
+    """获取进程内共享的响应缓存；未启用时返回 None"""
+    global _cache
+    if not RESPONSE_CACHE_ENABLED:
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = ResponseCache(
+                    max_entries=RESPONSE_CACHE_MAX_ENTRIES,
+                    ttl_seconds=RESPONSE_CACHE_TTL_SECONDS,
+                    db_path=RESPONSE_CACHE_DB_PATH,
+                    db_max_entries=RESPONSE_CACHE_DB_MAX_ENTRIES,
+                )
+    return _cache
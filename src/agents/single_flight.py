@@ -0,0 +1,151 @@
+import hashlib
+import logging
+import threading
+
+from agents.analysis_stream import AnalysisStream
+from agents.response_cache import normalize_report_text
+from config.prompts import PROMPT_VERSION
+
+logger = logging.getLogger(__name__)
+
+
+def make_flight_key(report_text, system_prompt, stream):
+    """并发去重的键：规范化后的报告、提示词版本与哈希、是否流式（与具体模型无关）"""
+    digest = hashlib.sha256()
+    for part in (PROMPT_VERSION, hashlib.sha256(system_prompt.encode("utf-8")).hexdigest(), bool(stream)):
+        digest.update(str(part).encode("utf-8"))
+        digest.update(b"\0")
+    digest.update(normalize_report_text(report_text).encode("utf-8"))
+    return digest.hexdigest()
+
+
+class StreamBroadcast:
+    """把一个流式结果分发给多个读取方
+
+    后台线程读取原始输出并缓存到列表中，每个订阅者从头按自己的节奏读取，
+    因此某个页面中途离开不会影响其他等待同一结果的页面；
+    原始流的结束回调（写缓存、记录路由指标等）也只会执行一次。
+    """
+
+    def __init__(self, source):
+        self.source = source
+        self._chunks = []
+        self._finished = False
+        self._cond = threading.Condition()
+        threading.Thread(target=self._pump, daemon=True).start()
+
+    def _pump(self):
+        try:
+            for text in self.source:
+                with self._cond:
+                    self._chunks.append(text)
+                    self._cond.notify_all()
+        finally:
+            with self._cond:
+                self._finished = True
+                self._cond.notify_all()
+
+    def subscribe(self):
+        """返回一个从头读取全部输出的新 AnalysisStream"""
+        subscriber = AnalysisStream("", self._iter_chunks(), self.source.model_used)
+        subscriber.usage = self.source.usage  # 同一个字典，原始流结束后由服务端用量填充
+        return subscriber
+
+    def _iter_chunks(self):
+        index = 0
+        while True:
+            with self._cond:
+                while index >= len(self._chunks) and not self._finished:
+                    self._cond.wait()
+                pending = self._chunks[index:]
+                finished = self._finished
+            for text in pending:
+                yield text
+            index += len(pending)
+            if finished and not pending:
+                if self.source.error:
+                    raise RuntimeError(self.source.error)
+                return
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.share = None
+        self.error = None
+
+
+class SingleFlight:
+    """相同请求的并发去重
+
+    同一键同时只有一个调用真正执行（leader），其余调用方（follower）等待并共享其结果；
+    流式结果通过 StreamBroadcast 分发，所有调用方都能逐段读取同一份输出。
+    follower 得到的结果带有 "shared": True。
+    """
+
+    def __init__(self):
+        self._flights = {}
+        self._lock = threading.Lock()
+        self._counters = {"leaders": 0, "followers": 0}
+
+    def do(self, key, fn):
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+                self._counters["leaders"] += 1
+            else:
+                self._counters["followers"] += 1
+
+        if not leader:
+            logger.info("相同的分析请求正在进行，等待共享其结果")
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.share(True)
+
+        try:
+            flight.share = self._make_share(fn())
+            return flight.share(False)
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+
+    @staticmethod
+    def _make_share(result):
+        """返回为每个调用方生成结果副本的函数"""
+        analysis_stream = result.get("stream") if result.get("success") else None
+        if analysis_stream is None:
+            return lambda shared: {**result, "shared": True} if shared else result
+        broadcast = StreamBroadcast(analysis_stream)
+
+        def share(shared):
+            copy = {**result, "stream": broadcast.subscribe()}
+            if shared:
+                copy["shared"] = True
+            return copy
+
+        return share
+
+    def stats(self):
+        with self._lock:
+            return {**self._counters, "in_flight": len(self._flights)}
+
+
+_single_flight = None
+_single_flight_lock = threading.Lock()
+
+
+def get_single_flight():
+    """获取进程内共享的并发去重器"""
+    global _single_flight
+    if _single_flight is None:
+        with _single_flight_lock:
+            if _single_flight is None:
+                _single_flight = SingleFlight()
+    return _single_flight
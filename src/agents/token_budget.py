@@ -0,0 +1,79 @@
+import threading
+
+from config.app_config import TOKEN_CALIBRATION_ALPHA
+from utils.token_estimator import estimate_tokens
+
+MESSAGE_OVERHEAD_TOKENS = 8  # 每条消息的角色标记等额外开销
+
+
+def estimate_request_tokens(system_prompt, user_content):
+    """估算一次请求（系统提示词 + 用户消息）的输入 token 数"""
+    return (
+        estimate_tokens(system_prompt)
+        + estimate_tokens(user_content)
+        + 2 * MESSAGE_OVERHEAD_TOKENS
+    )
+
+
+class TokenAccounting:
+    """按模型记录每次调用的预估与实际 token 用量
+
+    实际/预估比值的 EWMA 用于校准本地估算，使上下文窗口检查更贴近各模型的分词器。
+    """
+
+    MIN_CALIBRATION = 0.5
+    MAX_CALIBRATION = 2.0
+
+    def __init__(self, alpha=0.2):
+        self.alpha = alpha
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def calibration(self, model):
+        """返回模型的 实际/预估 校准系数，没有样本时为 1.0"""
+        with self._lock:
+            stats = self._stats.get(model)
+            return stats["calibration"] if stats else 1.0
+
+    def record(self, model, estimated_prompt_tokens, usage):
+        """记录一次调用；usage 为服务端返回的用量，缺失时只累计预估值"""
+        with self._lock:
+            stats = self._stats.setdefault(model, {
+                "calls": 0,
+                "estimated_prompt_tokens": 0,
+                "actual_prompt_tokens": 0,
+                "completion_tokens": 0,
+                "calibration": 1.0,
+            })
+            stats["calls"] += 1
+            stats["estimated_prompt_tokens"] += estimated_prompt_tokens
+            if not usage:
+                return
+            actual = usage.get("prompt_tokens") or 0
+            stats["actual_prompt_tokens"] += actual
+            stats["completion_tokens"] += usage.get("completion_tokens") or 0
+            if actual and estimated_prompt_tokens:
+                ratio = min(self.MAX_CALIBRATION, max(self.MIN_CALIBRATION, actual / estimated_prompt_tokens))
+                stats["calibration"] += self.alpha * (ratio - stats["calibration"])
+
+    def snapshot(self):
+        """返回各模型的用量统计，便于运维查看"""
+        with self._lock:
+            return [
+                {"model": model, **stats, "calibration": round(stats["calibration"], 3)}
+                for model, stats in self._stats.items()
+            ]
+
+
+_accounting = None
+_accounting_lock = threading.Lock()
+
+
+def get_token_accounting():
+    """获取进程内共享的 token 用量统计"""
+    global _accounting
+    if _accounting is None:
+        with _accounting_lock:
+            if _accounting is None:
+                _accounting = TokenAccounting(TOKEN_CALIBRATION_ALPHA)
+    return _accounting
@@ -0,0 +1,119 @@
+import logging
+import os
+import sqlite3
+import threading
+from datetime import datetime, timezone
+
+from config.app_config import USAGE_DB_PATH
+
+logger = logging.getLogger(__name__)
+
+
+def _today():
+    return datetime.now(timezone.utc).strftime("%Y-%m-%d")
+
+
+class UsageStore:
+    """按 (用户, 模型, 日期) 汇总的 token 用量
+
+    每个组合只保存一行累计值，写入为一次 UPSERT，数据量与调用次数无关。
+    db_path 为 None 时使用内存数据库（仅当前进程可见）。
+    """
+
+    def __init__(self, db_path=None):
+        self.db_path = db_path or ":memory:"
+        if db_path:
+            directory = os.path.dirname(db_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.db_path, timeout=10, check_same_thread=False)
+        with self._lock, self._conn:
+            if db_path:
+                self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS token_usage ("
+                " user_id TEXT NOT NULL,"
+                " model TEXT NOT NULL,"
+                " day TEXT NOT NULL,"
+                " prompt_tokens INTEGER NOT NULL DEFAULT 0,"
+                " completion_tokens INTEGER NOT NULL DEFAULT 0,"
+                " calls INTEGER NOT NULL DEFAULT 0,"
+                " PRIMARY KEY (user_id, model, day))"
+            )
+
+    def record(self, user_id, model, prompt_tokens, completion_tokens, day=None):
+        """累加一次调用的用量"""
+        try:
+            with self._lock, self._conn:
+                self._conn.execute(
+                    "INSERT INTO token_usage (user_id, model, day, prompt_tokens, completion_tokens, calls)"
+                    " VALUES (?, ?, ?, ?, ?, 1)"
+                    " ON CONFLICT (user_id, model, day) DO UPDATE SET"
+                    " prompt_tokens = prompt_tokens + excluded.prompt_tokens,"
+                    " completion_tokens = completion_tokens + excluded.completion_tokens,"
+                    " calls = calls + 1",
+                    (str(user_id), model, day or _today(), int(prompt_tokens), int(completion_tokens)),
+                )
+        except sqlite3.Error as e:
+            logger.warning(f"记录 token 用量失败: {str(e)}")
+
+    def total_tokens(self, user_id, since_day):
+        """返回用户自 since_day（含）以来消耗的 token 总数"""
+        try:
+            with self._lock:
+                row = self._conn.execute(
+                    "SELECT COALESCE(SUM(prompt_tokens + completion_tokens), 0) FROM token_usage"
+                    " WHERE user_id = ? AND day >= ?",
+                    (str(user_id), since_day),
+                ).fetchone()
+            return row[0]
+        except sqlite3.Error as e:
+            logger.warning(f"读取 token 用量失败: {str(e)}")
+            return 0
+
+    def top_consumers(self, since_day, limit=10):
+        """按 token 总量列出消耗最多的用户，附带各自用量最多的模型"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT user_id, model, SUM(prompt_tokens), SUM(completion_tokens), SUM(calls)"
+                " FROM token_usage WHERE day >= ? GROUP BY user_id, model",
+                (since_day,),
+            ).fetchall()
+        users = {}
+        for user_id, model, prompt_tokens, completion_tokens, calls in rows:
+            entry = users.setdefault(user_id, {
+                "user_id": user_id,
+                "total_tokens": 0,
+                "prompt_tokens": 0,
+                "completion_tokens": 0,
+                "calls": 0,
+                "models": {},
+            })
+            entry["total_tokens"] += prompt_tokens + completion_tokens
+            entry["prompt_tokens"] += prompt_tokens
+            entry["completion_tokens"] += completion_tokens
+            entry["calls"] += calls
+            entry["models"][model] = prompt_tokens + completion_tokens
+        ranked = sorted(users.values(), key=lambda entry: entry["total_tokens"], reverse=True)[:limit]
+        for entry in ranked:
+            entry["top_model"] = max(entry.pop("models").items(), key=lambda item: item[1])[0]
+        return ranked
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_usage_store():
+    """获取进程内共享的用量存储"""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                try:
+                    _store = UsageStore(USAGE_DB_PATH)
+                except sqlite3.Error as e:
+                    logger.error(f"初始化用量数据库失败，改用内存存储: {str(e)}")
+                    _store = UsageStore(None)
+    return _store
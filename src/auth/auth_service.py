@@ -1,6 +1,11 @@
 import streamlit as st  # Streamlit 提供会话状态与 UI 反馈能力
 from st_supabase_connection import SupabaseConnection  # 自定义的 Supabase 连接封装
 from datetime import datetime
+from collections import Counter
+from auth.remote_calls import get_remote_call_stats  # 每次页面运行的远程调用统计
+from auth.session_cache import get_session_list_cache  # 按用户缓存的会话列表
+from auth.message_cache import get_message_cache  # 按会话缓存的聊天消息
+from config.app_config import SESSION_BULK_DELETE_CHUNK_SIZE  # 批量删除时每条请求包含的会话数
 import time
 import re
 
@@ -8,6 +13,9 @@ class AuthService:
     """处理所有与 Supabase 认证和数据交互相关的服务"""
     def __init__(self):
         """初始化 AuthService 并建立 Supabase 连接"""
+        # 本次页面运行内的远程调用缓存与计数，由 begin_request 在每次运行开始时重置
+        self._memo = {}
+        self.remote_calls = Counter()
         try:
             # 自定义连接参数，以便控制超时与重试
             self.supabase = st.connection(
@@ -29,18 +37,43 @@ class AuthService:
         self.try_restore_session()
         
         # 初始化时立即验证一次已有令牌，确保状态一致
+        # （与上面的恢复共用同一次运行内的 get_session / get_user / users 查询结果，不会重复请求）
         if 'auth_token' in st.session_state:
             if not self.validate_session_token():
                 self.sign_out()
     
+    def begin_request(self):
+        """开始新的一次页面运行：提交上一次运行的调用计数，并清空运行内缓存"""
+        get_remote_call_stats().record_page_load(self.remote_calls)
+        self.remote_calls = Counter()
+        self._memo.clear()
+
+    def _count(self, name):
+        """记录一次 Supabase 远程调用"""
+        self.remote_calls[name] += 1
+
+    def _memoized(self, key, call):
+        """同一次页面运行内相同的调用只请求一次；key 的第一项为调用名
+
+        调用抛出的异常不会被缓存，下次仍会重新请求。
+        """
+        if key not in self._memo:
+            self._count(key[0])
+            self._memo[key] = call()
+        return self._memo[key]
+
+    def _get_session(self):
+        """读取当前 Supabase 会话（运行内缓存）"""
+        return self._memoized(('auth.get_session',), self.supabase.client.auth.get_session)
+
     def try_restore_session(self):
         """尝试从 Supabase 持久化数据中恢复会话"""
         try:
             # 直接读取 Supabase 的认证模块是否保留了会话
-            session = self.supabase.client.auth.get_session()
+            session = self._get_session()
             if session and session.access_token and 'auth_token' not in st.session_state:
                 # 拿到会话后再补拉一次用户数据，确保权限合法
-                user = self.supabase.client.auth.get_user()
+                user = self.get_user()
                 if user and user.user:
                     user_data = self.get_user_data(user.user.id)
                     if user_data:
@@ -58,6 +91,7 @@ class AuthService:
     def check_existing_user(self, email):
         """检查用户是否已存在"""
         try:
+            self._count('users.select')
             result = self.supabase.table('users')\
                 .select('id')\
                 .eq('email', email)\
@@ -69,6 +103,8 @@ class AuthService:
     def sign_up(self, email, password, name):
         """处理用户注册"""
         try:
+            self._count('auth.sign_up')
+            self._memo.clear()
             auth_response = self.supabase.client.auth.sign_up({
                 "email": email,
                 "password": password,
@@ -90,6 +126,7 @@ class AuthService:
             }
             
             # 将用户数据插入 users 表
+            self._count('users.insert')
             self.supabase.table('users').insert(user_data).execute()
             
             return True, user_data
@@ -103,9 +140,15 @@ class AuthService:
     def sign_in(self, email, password):
         """处理用户登录"""
         try:
-            # 登录前先清空旧会话，避免令牌混用
-            self.sign_out()
+            # 登录前先清空旧会话，避免令牌混用；本地没有会话时无需请求 Supabase 登出
+            if self._get_session():
+                self.sign_out()
+            else:
+                from auth.session_manager import SessionManager
+                SessionManager.clear_session_state()
             
+            self._count('auth.sign_in_with_password')
+            self._memo.clear()
             auth_response = self.supabase.client.auth.sign_in_with_password({
                 "email": email,
                 "password": password
@@ -129,6 +172,8 @@ class AuthService:
     def sign_out(self):
         """退出并清除所有会话数据"""
         try:
+            self._count('auth.sign_out')
+            self._memo.clear()
             self.supabase.client.auth.sign_out()
             from auth.session_manager import SessionManager
             SessionManager.clear_session_state()
@@ -137,9 +182,9 @@ class AuthService:
             return False, str(e)
     
     def get_user(self):
-        """获取当前用户信息"""
+        """获取当前用户信息（运行内缓存）"""
         try:
-            return self.supabase.client.auth.get_user()
+            return self._memoized(('auth.get_user',), self.supabase.client.auth.get_user)
         except Exception:
             return None
 
@@ -154,19 +199,29 @@ class AuthService:
                 'title': title or default_title,
                 'created_at': current_time.isoformat()
             }
+            self._count('chat_sessions.insert')
             result = self.supabase.table('chat_sessions').insert(session_data).execute()
-            return True, result.data[0] if result.data else None
+            session = result.data[0] if result.data else None
+            if session:
+                get_session_list_cache().add(user_id, session)
+            return True, session
         except Exception as e:
             return False, str(e)
 
     def get_user_sessions(self, user_id):
-        """获取用户的聊天会话"""
+        """获取用户的聊天会话（优先读取会话列表缓存）"""
+        cache = get_session_list_cache()
+        cached = cache.get(user_id)
+        if cached is not None:
+            return True, cached
         try:
+            self._count('chat_sessions.select')
             result = self.supabase.table('chat_sessions')\
                 .select('*')\
                 .eq('user_id', user_id)\
                 .order('created_at', desc=True)\
                 .execute()
+            cache.put(user_id, result.data)
             return True, result.data
         except Exception as e:
             st.error(f"获取会话时出错: {str(e)}")
@@ -181,32 +236,50 @@ class AuthService:
                 'role': role,
                 'created_at': datetime.now().isoformat()
             }
+            self._count('chat_messages.insert')
             result = self.supabase.table('chat_messages').insert(message_data).execute()
-            return True, result.data[0] if result.data else None
+            message = result.data[0] if result.data else None
+            if message:
+                get_message_cache().append(session_id, message)
+            return True, message
         except Exception as e:
             return False, str(e)
 
     def update_session_title(self, session_id, new_title):
         try:
             sid = str(session_id)
+            self._count('chat_sessions.update')
             self.supabase.table('chat_sessions')\
                 .update({'title': new_title})\
                 .eq('id', sid)\
                 .execute()
+            get_session_list_cache().update(sid, {'title': new_title})
             return True
         except Exception as e:
+            get_session_list_cache().invalidate_session(session_id)
             st.error(f"更新会话标题失败: {str(e)}")
             return False
 
     def get_session_messages(self, session_id):
-        """获取会话的所有消息"""
+        """获取会话的所有消息（已缓存的会话只查询新增消息）"""
         try:
-            result = self.supabase.table('chat_messages')\
+            cache = get_message_cache()
+            # None：未缓存，完整加载；""：已缓存但尚无消息，增量查询全部行；否则只查询不早于游标的行
+            cursor = cache.cursor(session_id)
+            cached = cursor is not None
+            query = self.supabase.table('chat_messages')\
                 .select('*')\
-                .eq('session_id', session_id)\
-                .order('created_at')\
-                .execute()
-            return True, result.data
+                .eq('session_id', session_id)
+            if cursor:
+                # created_at 相同的消息可能分批写入，用 gte 并由缓存按 id 去重
+                query = query.gte('created_at', cursor)
+            self._count('chat_messages.select')
+            result = query.order('created_at').execute()
+            messages = cache.merge(session_id, result.data, incremental=cached)
+            if messages is None:
+                # 增量查询期间缓存已被淘汰，重新完整加载
+                return self.get_session_messages(session_id)
+            return True, messages
         except Exception as e:
             return False, str(e)
 
@@ -216,26 +289,71 @@ class AuthService:
             sid = str(session_id)
 
             # 删除会话中的所有消息（忽略删除条数，只要不抛错即可）
+            self._count('chat_messages.delete')
             self.supabase.table('chat_messages')\
                 .delete()\
                 .eq('session_id', sid)\
                 .execute()
 
             # 删除会话本身，如果 Supabase 不抛异常则视为成功
+            self._count('chat_sessions.delete')
             self.supabase.table('chat_sessions')\
                 .delete()\
                 .eq('id', sid)\
                 .execute()
 
+            get_session_list_cache().remove([sid])
+            get_message_cache().remove([sid])
             return True, None
         except Exception as e:
+            # 可能只删除了部分数据，丢弃缓存以便下次重新查询
+            get_session_list_cache().invalidate_session(session_id)
             st.error(f"删除会话失败: {str(e)}")
             return False, str(e)
+
+    def delete_sessions(self, session_ids):
+        """批量删除聊天会话及其消息
+
+        每 SESSION_BULK_DELETE_CHUNK_SIZE 个会话只发两条请求：先按 session_id in (...) 删除消息，
+        再按 id in (...) 删除会话。返回 (是否全部成功, {会话 ID: 失败原因})。
+        """
+        ids = list(dict.fromkeys(str(sid) for sid in session_ids if sid is not None))
+        failures = {}
+        deleted = []
+        for start in range(0, len(ids), SESSION_BULK_DELETE_CHUNK_SIZE):
+            chunk = ids[start:start + SESSION_BULK_DELETE_CHUNK_SIZE]
+            try:
+                self._count('chat_messages.delete')
+                self.supabase.table('chat_messages')\
+                    .delete()\
+                    .in_('session_id', chunk)\
+                    .execute()
+
+                # 删除请求返回被删除的行，据此确认每个会话是否真的被删除
+                self._count('chat_sessions.delete')
+                result = self.supabase.table('chat_sessions')\
+                    .delete()\
+                    .in_('id', chunk)\
+                    .execute()
+                removed = {str(row.get('id')) for row in result.data or []}
+                for sid in chunk:
+                    if sid in removed:
+                        deleted.append(sid)
+                    else:
+                        failures[sid] = "会话不存在或无权删除"
+            except Exception as e:
+                for sid in chunk:
+                    failures[sid] = str(e)
+                    # 消息可能已被删除，丢弃缓存以便下次重新查询
+                    get_session_list_cache().invalidate_session(sid)
+        get_session_list_cache().remove(deleted)
+        get_message_cache().remove(ids)
+        return not failures, failures
     
     def validate_session_token(self):
         """在启动时验证现有的会话令牌"""
         try:
-            session = self.supabase.client.auth.get_session()
+            session = self._get_session()
             if not session or not session.access_token:
                 return None
                 
@@ -243,7 +361,7 @@ class AuthService:
             if session.access_token != st.session_state.get('auth_token'):
                 return None
                 
-            user = self.supabase.client.auth.get_user()
+            user = self.get_user()
             if not user or not user.user:
                 return None
                 
@@ -252,13 +370,16 @@ class AuthService:
             return None
     
     def get_user_data(self, user_id):
-        """从数据库获取用户数据"""
+        """从数据库获取用户数据（运行内缓存）"""
         try:
-            response = self.supabase.table('users')\
-                .select('*')\
-                .eq('id', user_id)\
-                .single()\
-                .execute()
+            response = self._memoized(
+                ('users.select', user_id),
+                lambda: self.supabase.table('users')
+                    .select('*')
+                    .eq('id', user_id)
+                    .single()
+                    .execute(),
+            )
             return response.data if response else None
         except Exception:
             return None
@@ -0,0 +1,115 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from config.app_config import MESSAGE_CACHE_MAX_SESSIONS, MESSAGE_CACHE_TTL_SECONDS
+
+
+def content_hash(text):
+    """消息内容的摘要，用于比较大段报告文本是否相同"""
+    return hashlib.sha256((text or "").encode("utf-8")).hexdigest()
+
+
+class SessionMessageCache:
+    """按会话缓存聊天消息（进程内共享），重新运行时只拉取新增的消息
+
+    - cursor 返回从数据库读到的最新 created_at，AuthService 据此只查询不早于它的行
+      （用 >= 避免漏掉 created_at 相同的消息，重复的行按 id 去重）；
+      本进程追加的消息不推进游标，避免跳过其他进程在此之前写入的消息
+    - 条目完整加载超过 ttl 秒后失效并重新完整加载，兜底其他进程删除或修改消息
+    - 每条消息缓存时附带 content_hash 字段，渲染时用摘要判断是否为已展示的报告
+    - 按消息 id 去重，多个页面同时增量拉取同一会话也不会重复
+    - 返回的消息字典与缓存共享，调用方应只读
+    """
+
+    def __init__(self, ttl=MESSAGE_CACHE_TTL_SECONDS, max_sessions=MESSAGE_CACHE_MAX_SESSIONS):
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self._lock = threading.Lock()
+        # session_id -> {"messages": [...], "ids": set(), "cursor": 数据库行最新 created_at, "loaded_at": 完整加载时间}
+        self._entries = OrderedDict()
+        self._counters = {"full_loads": 0, "incremental_loads": 0, "rows_fetched": 0, "appended": 0, "expired": 0}
+
+    def cursor(self, session_id):
+        """从数据库读到的最新 created_at；会话未缓存或已过期时返回 None，尚无消息时返回空字符串"""
+        session_id = str(session_id)
+        with self._lock:
+            entry = self._entries.get(session_id)
+            if entry is None:
+                return None
+            if time.monotonic() - entry["loaded_at"] >= self.ttl:
+                del self._entries[session_id]
+                self._counters["expired"] += 1
+                return None
+            return entry["cursor"]
+
+    def merge(self, session_id, rows, incremental):
+        """合并查询到的消息并返回该会话的完整消息列表
+
+        incremental 为 True 时 rows 只包含新消息；若此期间缓存已被淘汰则返回 None，
+        调用方需要重新完整加载。
+        """
+        session_id = str(session_id)
+        with self._lock:
+            entry = self._entries.get(session_id)
+            if incremental:
+                if entry is None:
+                    return None
+                self._counters["incremental_loads"] += 1
+            else:
+                entry = {"messages": [], "ids": set(), "cursor": "", "loaded_at": time.monotonic()}
+                self._entries[session_id] = entry
+                self._counters["full_loads"] += 1
+            self._counters["rows_fetched"] += len(rows)
+            added = False
+            for row in rows:
+                added = self._add(entry, row) or added
+                entry["cursor"] = max(entry["cursor"], row.get("created_at") or "")
+            if incremental and added:
+                # 其他进程写入的消息可能早于本进程追加的消息，按时间重新排序
+                entry["messages"].sort(key=lambda message: message.get("created_at") or "")
+            self._entries.move_to_end(session_id)
+            while len(self._entries) > self.max_sessions:
+                self._entries.popitem(last=False)
+            return list(entry["messages"])
+
+    def append(self, session_id, row):
+        """保存消息成功后追加到缓存；会话未缓存时不做处理"""
+        with self._lock:
+            entry = self._entries.get(str(session_id))
+            if entry is not None and self._add(entry, row):
+                self._counters["appended"] += 1
+
+    def remove(self, session_ids):
+        """删除会话后丢弃其消息缓存"""
+        with self._lock:
+            for session_id in session_ids:
+                self._entries.pop(str(session_id), None)
+
+    def stats(self):
+        with self._lock:
+            return {**self._counters, "sessions": len(self._entries)}
+
+    @staticmethod
+    def _add(entry, row):
+        message_id = row.get("id")
+        if message_id is not None and message_id in entry["ids"]:
+            return False
+        entry["ids"].add(message_id)
+        entry["messages"].append({**row, "content_hash": content_hash(row.get("content"))})
+        return True
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_message_cache():
+    """获取进程内共享的会话消息缓存"""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = SessionMessageCache()
+    return _cache
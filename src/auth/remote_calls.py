@@ -0,0 +1,57 @@
+import logging
+import threading
+from collections import Counter
+
+logger = logging.getLogger(__name__)
+
+
+class RemoteCallStats:
+    """汇总每次页面运行（Streamlit rerun）发出的 Supabase 远程调用次数
+
+    AuthService 在一次运行中自行计数，下一次运行开始时把上一次的计数提交到这里，
+    用于在运维面板上观察每次页面加载的远程调用数是否回升。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._page_loads = 0
+        self._total_calls = 0
+        self._max_calls = 0
+        self._calls = Counter()  # 调用名 -> 累计次数
+
+    def record_page_load(self, calls):
+        """提交一次页面运行的调用计数（调用名 -> 次数）"""
+        total = sum(calls.values())
+        with self._lock:
+            self._page_loads += 1
+            self._total_calls += total
+            self._max_calls = max(self._max_calls, total)
+            self._calls.update(calls)
+        if total:
+            logger.debug(f"本次页面运行的 Supabase 调用 {total} 次: {dict(calls)}")
+
+    def stats(self):
+        with self._lock:
+            loads = self._page_loads
+            return {
+                "page_loads": loads,
+                "calls_per_load": round(self._total_calls / loads, 2) if loads else 0.0,
+                "max_calls_per_load": self._max_calls,
+                "calls_per_load_by_name": {
+                    name: round(count / loads, 2) for name, count in self._calls.most_common()
+                } if loads else {},
+            }
+
+
+_stats = None
+_stats_lock = threading.Lock()
+
+
+def get_remote_call_stats():
+    """获取进程内共享的远程调用统计"""
+    global _stats
+    if _stats is None:
+        with _stats_lock:
+            if _stats is None:
+                _stats = RemoteCallStats()
+    return _stats
@@ -0,0 +1,124 @@
+import threading
+import time
+from collections import OrderedDict
+
+from config.app_config import SESSION_LIST_CACHE_TTL_SECONDS, SESSION_LIST_CACHE_MAX_USERS
+
+
+class SessionListCache:
+    """按用户缓存聊天会话列表（进程内共享）
+
+    - 会话的创建、重命名、删除成功后由 AuthService 直接更新缓存（写穿透），侧边栏刷新无需查询数据库
+    - 条目超过 ttl 秒后失效，兜底其他进程或直接修改数据库造成的不一致
+    - 最多保留 max_users 个用户的列表，按最近使用淘汰
+    - 读写都返回/保存副本，调用方修改会话字典不会影响缓存
+    """
+
+    def __init__(self, ttl=SESSION_LIST_CACHE_TTL_SECONDS, max_users=SESSION_LIST_CACHE_MAX_USERS):
+        self.ttl = ttl
+        self.max_users = max_users
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # user_id -> (写入时间, 会话列表)
+        self._owners = {}  # session_id -> user_id，用于只知道会话 ID 的更新与删除
+        self._counters = {"hits": 0, "misses": 0, "writes": 0, "invalidations": 0}
+
+    def get(self, user_id):
+        """返回缓存的会话列表副本，未命中或已过期时返回 None"""
+        user_id = str(user_id)
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry and time.monotonic() - entry[0] < self.ttl:
+                self._entries.move_to_end(user_id)
+                self._counters["hits"] += 1
+                return [dict(session) for session in entry[1]]
+            if entry:
+                self._drop(user_id)
+            self._counters["misses"] += 1
+            return None
+
+    def put(self, user_id, sessions):
+        """保存从数据库读取的完整会话列表（已按 created_at 倒序）"""
+        user_id = str(user_id)
+        with self._lock:
+            self._drop(user_id)
+            self._entries[user_id] = (time.monotonic(), [dict(session) for session in sessions])
+            for session in sessions:
+                self._owners[str(session.get('id'))] = user_id
+            while len(self._entries) > self.max_users:
+                self._drop(next(iter(self._entries)))
+
+    def add(self, user_id, session):
+        """新建会话成功后插入到列表最前；该用户未缓存时不做处理"""
+        user_id = str(user_id)
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if not entry:
+                return
+            entry[1].insert(0, dict(session))
+            self._owners[str(session.get('id'))] = user_id
+            self._counters["writes"] += 1
+
+    def update(self, session_id, changes):
+        """更新某个会话的字段（例如标题）"""
+        session_id = str(session_id)
+        with self._lock:
+            session = self._find(session_id)
+            if session is not None:
+                session.update(changes)
+                self._counters["writes"] += 1
+
+    def remove(self, session_ids):
+        """从所属用户的列表中移除若干会话"""
+        session_ids = {str(sid) for sid in session_ids}
+        with self._lock:
+            for user_id in {self._owners.pop(sid, None) for sid in session_ids} - {None}:
+                entry = self._entries.get(user_id)
+                if entry:
+                    entry[1][:] = [s for s in entry[1] if str(s.get('id')) not in session_ids]
+                    self._counters["writes"] += 1
+
+    def invalidate_session(self, session_id):
+        """写入结果不确定时（例如部分失败）丢弃会话所属用户的整个列表"""
+        with self._lock:
+            user_id = self._owners.get(str(session_id))
+            if user_id:
+                self._drop(user_id)
+                self._counters["invalidations"] += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self._counters["hits"] + self._counters["misses"]
+            return {
+                **self._counters,
+                "hit_rate": round(self._counters["hits"] / lookups, 3) if lookups else 0.0,
+                "users": len(self._entries),
+            }
+
+    def _find(self, session_id):
+        user_id = self._owners.get(session_id)
+        entry = self._entries.get(user_id) if user_id else None
+        if entry:
+            for session in entry[1]:
+                if str(session.get('id')) == session_id:
+                    return session
+        return None
+
+    def _drop(self, user_id):
+        entry = self._entries.pop(user_id, None)
+        if entry:
+            for session in entry[1]:
+                self._owners.pop(str(session.get('id')), None)
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_session_list_cache():
+    """获取进程内共享的会话列表缓存"""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = SessionListCache()
+    return _cache
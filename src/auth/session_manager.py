@@ -1,7 +1,13 @@
 import streamlit as st  # 引入 Streamlit 会话状态容器
 from datetime import datetime, timedelta  # 处理时间计算与超时逻辑
-from config.app_config import SESSION_TIMEOUT_MINUTES  # 会话超时配置
+from config.app_config import (
+    SESSION_TIMEOUT_MINUTES,  # 会话超时配置
+    AUTH_PROFILE_CACHE_TTL_SECONDS,
+    AUTH_TOKEN_REFRESH_MARGIN_SECONDS,
+)
+from auth.token_verifier import get_token_verifier  # 本地校验访问令牌
 import json
+import time
 
 class SessionManager:
     """管理用户会话，包括初始化、验证、超时和持久化"""
@@ -23,6 +29,9 @@ class SessionManager:
         if 'auth_service' not in st.session_state:
             from auth.auth_service import AuthService
             st.session_state.auth_service = AuthService()
+        else:
+            # 每次重新运行开始时重置运行内的调用缓存，并提交上一次运行的调用计数
+            st.session_state.auth_service.begin_request()
         
         # 检查会话超时
         if 'last_activity' in st.session_state:
@@ -37,12 +46,55 @@ class SessionManager:
 
         # 当存在已登录用户和令牌时才验证会话有效性
         if st.session_state.user and st.session_state.get('auth_token'):
-            user_data = st.session_state.auth_service.validate_session_token()
+            user_data = SessionManager._validate_session()
             if not user_data:
                 SessionManager.clear_session_state()
                 st.error("无效的会话，请重新登录。")
                 st.rerun()
     
+    @staticmethod
+    def _validate_session():
+        """验证当前令牌并返回用户资料，无效时返回 None
+
+        每次重新运行都先在本地校验令牌（签名与有效期）；只有已验证资料的缓存过期、
+        令牌即将过期或本地校验不通过时，才向 Supabase 完整校验（get_session、get_user 与 users 查询）。
+        """
+        token = st.session_state.auth_token
+        claims = get_token_verifier().verify(token)
+        if claims is None or claims.get('sub') != st.session_state.user.get('id'):
+            # 本地无法确认时交由服务端判断，例如令牌已被 Supabase 客户端刷新
+            return SessionManager._validate_remotely(token)
+
+        now = time.time()
+        cached = st.session_state.get('auth_profile_cache')
+        if (
+            cached
+            and cached['token'] == token
+            and now < cached['expires_at']
+            and claims['exp'] - now > AUTH_TOKEN_REFRESH_MARGIN_SECONDS
+        ):
+            return cached['user']
+        return SessionManager._validate_remotely(token)
+
+    @staticmethod
+    def _validate_remotely(token):
+        """向 Supabase 完整校验令牌，成功后缓存用户资料"""
+        user_data = st.session_state.auth_service.validate_session_token()
+        if user_data:
+            SessionManager._cache_profile(token, user_data)
+        else:
+            st.session_state.pop('auth_profile_cache', None)
+        return user_data
+
+    @staticmethod
+    def _cache_profile(token, user_data):
+        """记录刚由服务端确认过的令牌与用户资料"""
+        st.session_state.auth_profile_cache = {
+            'token': token,
+            'user': user_data,
+            'expires_at': time.time() + AUTH_PROFILE_CACHE_TTL_SECONDS,
+        }
+
     @staticmethod
     def _restore_from_storage():
         """从持久化存储中恢复会话"""
@@ -160,6 +212,13 @@ class SessionManager:
         if not SessionManager.is_authenticated():
             return False, "未通过身份验证"
         return st.session_state.auth_service.delete_session(str(session_id))
+
+    @staticmethod
+    def delete_sessions(session_ids):
+        """批量删除聊天会话，返回 (是否全部成功, {会话 ID: 失败原因})"""
+        if not SessionManager.is_authenticated():
+            return False, {str(sid): "未通过身份验证" for sid in session_ids}
+        return st.session_state.auth_service.delete_sessions(session_ids)
     
     @staticmethod
     def logout():
@@ -179,6 +238,8 @@ class SessionManager:
         
         # 登录成功且拿到 token 时，再同步存入浏览器
         if success and 'auth_token' in st.session_state:
+            # 登录时刚向 Supabase 取得的资料可直接作为已验证缓存
+            SessionManager._cache_profile(st.session_state.auth_token, user_data)
             SessionManager._save_to_persistent_storage(
                 user_data, 
                 st.session_state.auth_token
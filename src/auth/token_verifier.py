@@ -0,0 +1,64 @@
+import logging
+import threading
+
+import jwt  # PyJWT，用于本地解析与校验 Supabase 签发的访问令牌
+
+from config.settings import get_setting
+from config.app_config import AUTH_JWT_LEEWAY_SECONDS
+
+logger = logging.getLogger(__name__)
+
+SUPABASE_JWT_AUDIENCE = "authenticated"  # Supabase 为已登录用户签发令牌时使用的 aud
+
+
+class TokenVerifier:
+    """在本地校验 Supabase 访问令牌，无需请求认证服务
+
+    - 配置了 SUPABASE_JWT_SECRET 时校验 HS256 签名、exp 与 aud
+    - 未配置时只读取并校验 exp：令牌只会来自 Supabase 的登录响应并保存在服务端的
+      session_state 中，浏览器无法篡改，此时签名校验交给定期的服务端完整校验
+    """
+
+    def __init__(self, secret=None, leeway=AUTH_JWT_LEEWAY_SECONDS):
+        self.secret = secret
+        self.leeway = leeway
+
+    def verify(self, token):
+        """校验令牌，返回其中的 claims；签名错误、已过期或格式不合法时返回 None"""
+        if not token:
+            return None
+        try:
+            if self.secret:
+                return jwt.decode(
+                    token,
+                    self.secret,
+                    algorithms=["HS256"],
+                    audience=SUPABASE_JWT_AUDIENCE,
+                    leeway=self.leeway,
+                    options={"require": ["exp", "sub"]},
+                )
+            return jwt.decode(
+                token,
+                options={"verify_signature": False, "verify_exp": True, "require": ["exp", "sub"]},
+                leeway=self.leeway,
+            )
+        except jwt.InvalidTokenError as e:
+            logger.info(f"访问令牌本地校验未通过: {str(e)}")
+            return None
+
+
+_verifier = None
+_verifier_lock = threading.Lock()
+
+
+def get_token_verifier():
+    """获取进程内共享的令牌校验器"""
+    global _verifier
+    if _verifier is None:
+        with _verifier_lock:
+            if _verifier is None:
+                secret = get_setting("SUPABASE_JWT_SECRET")
+                if not secret:
+                    logger.warning("未配置 SUPABASE_JWT_SECRET，访问令牌仅在本地检查有效期，签名由服务端定期校验")
+                _verifier = TokenVerifier(secret)
+    return _verifier
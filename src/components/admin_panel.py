@@ -0,0 +1,69 @@
+import streamlit as st  # Streamlit 交互式界面库
+from dataclasses import asdict
+from datetime import datetime, timedelta, timezone
+from config.app_config import ADMIN_EMAILS  # 管理员名单
+from agents.model_manager import ModelManager  # 模型列表与质量评分
+from agents.model_router import get_model_router  # 模型路由实时评分
+from agents.resilience import get_breaker_board  # 各模型熔断状态
+from agents.response_cache import get_response_cache  # 模型响应缓存统计
+from agents.client_registry import get_client_registry  # 共享连接池统计
+from agents.hedging import get_hedge_budget  # 对冲请求统计
+from agents.admission import get_admission_controller  # 并发与排队统计
+from agents.single_flight import get_single_flight  # 并发去重统计
+from agents.token_budget import get_token_accounting  # 预估与实际 token 用量
+from agents.usage_store import get_usage_store  # 按用户汇总的 token 用量
+from auth.remote_calls import get_remote_call_stats  # 每次页面运行的 Supabase 调用数
+from auth.session_cache import get_session_list_cache  # 会话列表缓存命中率
+from auth.message_cache import get_message_cache  # 聊天消息增量缓存统计
+from utils.extraction_cache import get_extraction_cache  # PDF 解析缓存统计
+from utils.text_normalizer import get_normalization_totals  # 报告文本规整节省的字符与 token
+
+def is_admin():
+    """判断当前登录用户是否为管理员"""
+    user = st.session_state.get("user") or {}
+    return bool(user.get("email")) and user.get("email") in ADMIN_EMAILS
+
+def show_admin_panel():
+    """在侧边栏为管理员展示运维面板（模型评分板、熔断与缓存状态）"""
+    if not is_admin():
+        return
+
+    with st.expander("运维面板", expanded=False):
+        st.markdown("**模型路由评分板**")
+        scoreboard = get_model_router().snapshot(ModelManager.MODELS, ModelManager.MODEL_QUALITY)
+        st.dataframe(scoreboard, use_container_width=True, hide_index=True)
+
+        st.markdown("**Token 用量（预估 / 实际）**")
+        st.dataframe(get_token_accounting().snapshot(), use_container_width=True, hide_index=True)
+
+        st.markdown("**近 30 天 token 用量最多的用户**")
+        since_day = (datetime.now(timezone.utc) - timedelta(days=30)).strftime("%Y-%m-%d")
+        st.dataframe(get_usage_store().top_consumers(since_day), use_container_width=True, hide_index=True)
+
+        st.markdown("**模型熔断状态**")
+        st.json(get_breaker_board().snapshot(), expanded=False)
+
+        st.markdown("**缓存与连接池**")
+        response_cache = get_response_cache()
+        st.json({
+            "response_cache": response_cache.stats() if response_cache else None,
+            "pdf_extraction_cache": get_extraction_cache().stats(),
+            "pdf_text_normalization": _normalization_summary(),
+            "groq_pool": get_client_registry().stats(),
+            "hedging": get_hedge_budget().stats(),
+            "admission": get_admission_controller().stats(),
+            "single_flight": get_single_flight().stats(),
+            "supabase_calls": get_remote_call_stats().stats(),
+            "session_list_cache": get_session_list_cache().stats(),
+            "message_cache": get_message_cache().stats(),
+        }, expanded=False)
+
+
+def _normalization_summary():
+    """报告文本规整的累计效果"""
+    totals = get_normalization_totals()
+    return {
+        **asdict(totals),
+        "chars_saved": totals.chars_saved,
+        "tokens_saved": totals.tokens_saved,
+    }
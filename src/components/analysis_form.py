@@ -1,10 +1,13 @@
 import streamlit as st  # Streamlit 交互式界面库
 from services.ai_service import generate_analysis  # 封装好的分析入口
 from config.prompts import SPECIALIST_PROMPTS  # 领域专家提示词
-from utils.pdf_extractor import extract_text_from_pdf  # PDF 文本抽取工具
+from utils.pdf_extractor import extract_text_from_pdf, extract_tables_from_pdf, is_extraction_error  # PDF 文本/表格抽取工具
+from utils.lab_parser import build_report_prompt  # 将报告文本压缩为结构化检验结果表
 from config.sample_data import SAMPLE_REPORT  # 示例体检报告文本
-from config.app_config import MAX_UPLOAD_SIZE_MB  # 上传大小限制
+from config.app_config import MAX_UPLOAD_SIZE_MB, ANALYSIS_STREAMING  # 上传大小限制、是否流式输出
 from utils.pdf_exporter import create_analysis_pdf  # 导出 PDF 的工具函数
+from agents.rate_limiter import format_retry_after  # 等待时间格式化
+from auth.message_cache import content_hash  # 报告内容摘要，用于在聊天记录中隐藏已展示的报告
 import re
 
 def show_analysis_form():
@@ -73,6 +76,9 @@ def get_report_contents():
     expander_label = "测试-体检结果-内容提取" if use_sample else "PDF-体检结果-内容提取"
     expander_container = st.expander(expander_label)  # 使用折叠面板展示原始文本，避免侵占过多空间
 
+    # 记录当前上传的 PDF，提交分析时再从中提取表格结构
+    st.session_state.current_report_file = None if use_sample else uploaded_file
+
     if use_sample:
         with expander_container:
             st.text(SAMPLE_REPORT)  # 直接展示示例文本
@@ -90,12 +96,8 @@ def get_report_contents():
             return None
 
         pdf_contents = extract_text_from_pdf(uploaded_file)
-        # PDF 抽取器可能返回错误消息字符串，这里做统一处理
-        if isinstance(pdf_contents, str) and (
-            pdf_contents.startswith(("File size exceeds", "Invalid file type", "Error validating")) or
-            pdf_contents.startswith("The uploaded file") or
-            "error" in pdf_contents.lower()
-        ):
+        # PDF 抽取器出错时返回 ExtractionError（错误消息字符串），这里做统一处理
+        if is_extraction_error(pdf_contents):
             st.error(pdf_contents)
             return None
 
@@ -122,17 +124,29 @@ def handle_form_submission(pdf_contents):
         st.stop()
         return
 
-    # 包裹在 spinner 中突出“后台处理中”状态
+    # 高峰期分析请求需要排队，排队期间展示当前位置与预计等待时间
+    queue_placeholder = st.empty()
+
+    def show_queue_status(position, eta_seconds):
+        queue_placeholder.info(
+            f"当前分析请求较多，正在排队：前面还有 {position} 个请求，预计等待约 {format_retry_after(eta_seconds)}"
+        )
+
+    # 包裹在 spinner 中突出“后台处理中”状态（流式模式下只持续到首个 token）
     with st.spinner("正在生成体检报告，请稍候..."):
         result = generate_analysis({
-            "report": pdf_contents
-        }, SPECIALIST_PROMPTS["comprehensive_analyst"])
-    
+            "report": _build_report_payload(pdf_contents)
+        }, SPECIALIST_PROMPTS["comprehensive_analyst"], stream=ANALYSIS_STREAMING, on_queue=show_queue_status)
+    queue_placeholder.empty()
+
+    if result["success"] and result.get("stream") is not None:
+        result = _render_stream(result)
+
     if result["success"]:
         # 如果分析成功，则保存到本地状态并写入数据库，确保刷新后仍可查看
         content = result["content"]
         st.session_state.generated_report = content
-        st.session_state.last_hidden_report = content
+        st.session_state.last_hidden_report_hash = content_hash(content)  # 聊天记录中按摘要隐藏这份报告
         st.session_state.auth_service.save_chat_message(
             st.session_state.current_session['id'],
             content,
@@ -158,6 +172,25 @@ def handle_form_submission(pdf_contents):
         st.error(result["error"])
         st.stop()
 
+def _render_stream(result):
+    """边生成边渲染模型输出，结束后转换为普通结果字典"""
+    analysis_stream = result["stream"]
+    with st.expander("体检报告-内容提取", expanded=True):
+        st.write_stream(analysis_stream)
+    if analysis_stream.error:
+        return {"success": False, "error": f"生成过程中断: {analysis_stream.error}"}
+    return {
+        "success": True,
+        "content": analysis_stream.content,
+        "model_used": result.get("model_used"),
+    }
+
+def _build_report_payload(pdf_contents):
+    """将原始报告文本（及 PDF 表格）压缩为发送给模型的紧凑检验结果表"""
+    report_file = st.session_state.get("current_report_file")
+    tables = extract_tables_from_pdf(report_file) if report_file is not None else None
+    return build_report_prompt(pdf_contents, tables)
+
 def render_generated_report():
     report_text = st.session_state.get("generated_report")
     if not report_text:
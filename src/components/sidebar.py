@@ -2,6 +2,7 @@ import streamlit as st  # 引入 Streamlit 以构建交互式侧边栏
 from datetime import datetime  # 负责时间格式化与解析
 from auth.session_manager import SessionManager  # 会话管理工具，统一处理增删查
 from components.footer import show_footer  # 侧边栏底部的版权/辅助信息
+from components.admin_panel import show_admin_panel  # 管理员可见的运维面板
 
 def show_sidebar():
     """显示侧边栏"""
@@ -22,6 +23,8 @@ def show_sidebar():
 
         show_session_list()  # 渲染历史体检报告列表
 
+        show_admin_panel()  # 仅管理员可见：模型评分板、熔断与缓存状态
+
         st.markdown(
             "<hr class='sidebar-section-divider sidebar-bottom-divider' />",
             unsafe_allow_html=True,
@@ -235,20 +238,23 @@ def handle_bulk_delete(selected_session_ids):
     ]  # 取出已有的删除列表
     st.session_state.deleted_sessions = list(set(existing_deleted + normalized_ids))  # 合并并去重，实现乐观更新
 
-    failed_errors = []  # 用于收集后端失败信息
-    for session_id in normalized_ids:
-        success, error = SessionManager.delete_session(session_id)
-        if not success:
-            failed_errors.append(error)  # 记录失败原因
+    _, failures = SessionManager.delete_sessions(normalized_ids)  # 一次批量请求删除全部选中会话
+    if failures:
+        # 删除失败的会话恢复显示，避免乐观更新把仍存在的记录隐藏掉
+        st.session_state.deleted_sessions = [
+            sid for sid in st.session_state.deleted_sessions if sid not in failures
+        ]
 
     current_session_id_str = str(current_session_id) if current_session_id else None
-    if current_session_id_str and current_session_id_str in normalized_ids:
+    if current_session_id_str and current_session_id_str in normalized_ids and current_session_id_str not in failures:
         st.session_state.current_session = None  # 若当前会话被删除，则清空引用
 
     st.session_state.selected_sessions = []  # 操作完成后清空所有勾选
 
-    if failed_errors:
-        st.warning("部分体检报告在服务器端删除失败，请稍后重试或联系管理员。")  # 提示部分失败
+    if failures:
+        st.warning(
+            f"{len(failures)} 份体检报告在服务器端删除失败，请稍后重试或联系管理员。"
+        )  # 提示部分失败
     else:
         st.success("已删除选中的体检报告")  # 全部成功时给出成功反馈
 
@@ -10,3 +10,97 @@ ANALYSIS_DAILY_LIMIT = 6  # 每日分析次数限制
 # UI界面设置
 PRIMARY_COLOR = "#64B5F6"  # 主题颜色
 SECONDARY_COLOR = "#1976D2"  # 次要颜色
+
+# PDF 解析缓存设置
+PDF_CACHE_MAX_ENTRIES = 64  # 内存 LRU 缓存保留的报告数量
+PDF_CACHE_DIR = None  # 磁盘缓存目录，设置后可在多个服务进程间共享解析结果
+
+# PDF 并行解析设置
+PDF_EXTRACT_WORKERS = 4  # 并行解析的进程数，设为 1 则始终串行解析
+PDF_PARALLEL_MIN_PAGES = 8  # 少于该页数的 PDF 直接串行解析，避免进程调度开销
+PDF_CLASSIFY_PAGE_WINDOW = 5  # 前 N 页仍未识别为体检报告时提前拒绝，无需解析全文；这几页始终串行解析
+PDF_PARALLEL_TIMEOUT_SECONDS = 60.0  # 并行解析的最长等待时间 (秒)，超时后丢弃进程池并改为串行解析剩余页面
+PDF_TEXT_BACKEND = "hybrid"  # 文本解析后端：hybrid（pypdfium2 优先，表格页回退 pdfplumber）/ pdfium / pdfplumber
+
+# 模型调用设置
+ANALYSIS_STREAMING = True  # 是否流式输出分析结果，边生成边渲染
+
+# 模型响应缓存设置
+RESPONSE_CACHE_ENABLED = True  # 是否缓存相同报告的分析结果
+RESPONSE_CACHE_MAX_ENTRIES = 256  # 内存 LRU 缓存条数
+RESPONSE_CACHE_TTL_SECONDS = 7 * 24 * 3600  # 缓存有效期 (秒)
+RESPONSE_CACHE_DB_PATH = ".cache/response_cache.sqlite3"  # SQLite 持久化文件，设为 None 则仅使用内存缓存
+RESPONSE_CACHE_DB_MAX_ENTRIES = 5000  # SQLite 中保留的最大条数
+
+# Groq 共享连接池设置
+GROQ_MAX_CONNECTIONS = 100  # 进程内到 Groq 的最大并发连接数
+GROQ_MAX_KEEPALIVE_CONNECTIONS = 20  # 保持长连接的空闲连接数上限
+GROQ_KEEPALIVE_EXPIRY_SECONDS = 30.0  # 空闲连接保活时长 (秒)
+
+# 模型重试与熔断设置
+MODEL_MAX_RETRIES = 2  # 同一模型遇到临时错误时的最大重试次数
+MODEL_BACKOFF_BASE_SECONDS = 1.0  # 指数退避的基础等待时间 (秒)
+MODEL_BACKOFF_MAX_SECONDS = 8.0  # 单次最长等待；Retry-After 超过该值时直接切换模型
+CIRCUIT_FAILURE_THRESHOLD = 3  # 连续失败多少次后熔断该模型
+CIRCUIT_COOLDOWN_SECONDS = 30.0  # 熔断后的冷却时间 (秒)
+
+# 自适应模型路由设置
+MODEL_QUALITY_FLOOR = 0.5  # 质量评分低于该值的模型不参与路由
+ROUTER_EWMA_ALPHA = 0.3  # EWMA 平滑系数，越大越偏向最近的调用
+ROUTER_ERROR_PENALTY = 4.0  # 错误率对评分的惩罚倍数
+ROUTER_PRIOR_LATENCY_SECONDS = 10.0  # 尚无样本时假定的模型延迟 (秒)
+ROUTER_DECAY_HALF_LIFE_SECONDS = 300.0  # 指标向先验值回归的半衰期，使降级的模型有机会被重新尝试
+ADMIN_EMAILS = []  # 可查看运维面板的管理员邮箱
+
+# 对冲请求设置
+HEDGE_ENABLED = True  # 主模型迟迟未返回时是否并发请求下一个模型
+HEDGE_LATENCY_PERCENTILE = 0.95  # 以主模型最近延迟的该分位数作为对冲触发时间
+HEDGE_MIN_SAMPLES = 5  # 延迟样本少于该数量时使用默认触发时间
+HEDGE_DEFAULT_DELAY_SECONDS = 15.0  # 默认对冲触发时间 (秒)
+HEDGE_MAX_EXTRA_RATIO = 0.1  # 对冲调用数占总调用数的上限，控制额外开销
+HEDGE_BUDGET_BURST = 3.0  # 对冲额度最多累积的次数，允许短时突发
+
+# 上下文窗口与 token 预算设置
+TOKEN_ESTIMATE_MARGIN = 0.15  # 本地估算的安全余量，抵消与真实分词器之间的误差
+TOKEN_CALIBRATION_ALPHA = 0.2  # 用实际用量校准估算值时的 EWMA 系数
+
+# 分节并行分析（map-reduce）设置
+ANALYSIS_MODE = "auto"  # single：整份报告一次请求；map_reduce：按检查分节并行分析后汇总；auto：报告较长时自动分节
+MAP_REDUCE_MIN_SECTIONS = 3  # auto 模式下至少有多少个分节才拆分
+MAP_REDUCE_MIN_TOKENS = 1500  # auto 模式下报告预估 token 数达到该值才拆分
+MAP_REDUCE_MAX_SECTIONS = 8  # 分节过多时合并相邻的小分节，限制请求数
+MAP_REDUCE_MAX_WORKERS = 4  # 同一份报告并发分析的分节数上限
+MAP_REDUCE_MAX_CONCURRENT_CALLS = 8  # 全进程同时进行的分节调用数上限（所有报告合计）
+
+# 分析次数限流设置（每日上限见 ANALYSIS_DAILY_LIMIT）
+RATE_LIMIT_WINDOW_SECONDS = 24 * 3600  # 滑动窗口长度 (秒)
+RATE_LIMIT_BURST = 2  # 令牌桶容量：短时间内最多连续分析的次数
+RATE_LIMIT_REFILL_SECONDS = 60.0  # 令牌桶每补充一次的间隔 (秒)
+RATE_LIMIT_BACKEND = "sqlite"  # 计数器存储：sqlite（多进程共享）或 memory（仅当前进程）
+RATE_LIMIT_DB_PATH = ".cache/rate_limit.sqlite3"  # SQLite 计数器文件
+
+# Token 用量统计与预算设置
+USAGE_DB_PATH = ".cache/token_usage.sqlite3"  # 按用户、模型、日期汇总的用量文件，设为 None 则仅保存在内存中
+USER_DAILY_TOKEN_BUDGET = 300000  # 每个用户每天（UTC）可消耗的 token 数，None 表示不限
+USER_MONTHLY_TOKEN_BUDGET = None  # 每个用户每月（UTC）可消耗的 token 数，None 表示不限
+
+# 分析请求准入控制（进程内并发上限与按用户加权公平排队）
+ADMISSION_MAX_CONCURRENT = 8  # 同时进行的分析数上限（按分析计，不是模型调用数）；上游并发调用最多为本值 + MAP_REDUCE_MAX_CONCURRENT_CALLS，另加受 HEDGE_MAX_EXTRA_RATIO 限制的对冲调用
+ADMISSION_QUEUE_TIMEOUT_SECONDS = 120.0  # 排队超过该时间则放弃并提示稍后重试
+ADMISSION_LEASE_SECONDS = 600.0  # 名额最长占用时间，超时自动回收（例如流式输出未被读完就离开页面）
+ADMISSION_INITIAL_SERVICE_SECONDS = 15.0  # 尚无统计时假定的单次分析耗时，用于估算等待时间
+ADMISSION_USER_WEIGHTS = {}  # 用户 ID -> 排队权重，默认 1.0；权重越大分到的并发份额越多
+
+# 登录令牌校验设置
+AUTH_PROFILE_CACHE_TTL_SECONDS = 300  # 令牌本地校验通过时复用已验证用户资料的时长 (秒)，到期后向 Supabase 完整校验一次
+AUTH_TOKEN_REFRESH_MARGIN_SECONDS = 60  # 令牌剩余有效期不足该值时直接向 Supabase 校验
+AUTH_JWT_LEEWAY_SECONDS = 10  # 校验 exp 时容忍的时钟偏差 (秒)
+
+# 会话列表与聊天消息缓存设置
+SESSION_LIST_CACHE_TTL_SECONDS = 300  # 侧边栏会话列表缓存的有效期 (秒)，本进程内的增删改会直接更新缓存
+SESSION_LIST_CACHE_MAX_USERS = 1000  # 最多缓存多少个用户的会话列表
+MESSAGE_CACHE_MAX_SESSIONS = 64  # 最多缓存多少个会话的聊天消息，重新运行时只查询新增消息
+MESSAGE_CACHE_TTL_SECONDS = 300  # 会话消息缓存完整加载后的有效期 (秒)，到期后重新完整加载，兜底其他进程删除或修改消息
+
+# 会话批量删除设置
+SESSION_BULK_DELETE_CHUNK_SIZE = 100  # 批量删除时每条 in (...) 请求包含的会话数，避免请求 URL 过长
@@ -0,0 +1,17 @@
+import os
+
+import streamlit as st
+
+
+def get_setting(name, default=None):
+    """读取配置：优先使用环境变量，其次使用 Streamlit secrets
+
+    命令行工具（批量分析、压测）在没有 secrets.toml 时也能通过环境变量运行。
+    """
+    value = os.environ.get(name)
+    if value:
+        return value
+    try:
+        return st.secrets.get(name, default)
+    except FileNotFoundError:
+        return default
@@ -1,5 +1,6 @@
 import streamlit as st  # 导入 Streamlit 库，用于构建 Web 应用界面，并简写为 st
 from auth.session_manager import SessionManager  # 从自定义模块导入会话管理工具，用于处理登录状态等
+from auth.message_cache import content_hash  # 聊天消息内容摘要，用于隐藏已展示的报告
 from components.auth_pages import show_login_page  # 导入登录/注册页面渲染函数
 from components.sidebar import show_sidebar  # 导入侧边栏渲染函数
 from components.analysis_form import show_analysis_form  # 导入体检报告分析表单组件
@@ -634,17 +635,18 @@ def show_chat_history():
     if not messages:
         return
 
-    generated_report = st.session_state.get("generated_report")
-    last_hidden_report = st.session_state.get("last_hidden_report")
+    # 按内容摘要比较，避免逐条比较整份报告文本
+    hidden_report_hash = st.session_state.get("last_hidden_report_hash")
+    if not hidden_report_hash and st.session_state.get("generated_report"):
+        hidden_report_hash = content_hash(st.session_state.generated_report)
 
     for message in messages:
         role = message.get('role', 'assistant')
         content = message.get('content', '')
 
         # 避免在聊天记录中再次渲染已经通过下拉框展示的生成报告内容
-        hidden_report = last_hidden_report or generated_report
         if role == 'assistant':
-            if hidden_report and content == hidden_report:
+            if hidden_report_hash and message.get('content_hash') == hidden_report_hash:
                 continue
             first_line = content.strip().splitlines()[0] if content.strip() else ""
             if "体检报告" in first_line:
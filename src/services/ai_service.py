@@ -2,18 +2,30 @@ import streamlit as st
 from agents.analysis_agent import AnalysisAgent
 
 def init_analysis_state():
-    """Initialize analysis-related session state variables."""
+    """Initialize analysis-related session state variables.
+
+    The per-session agent is cheap: its model client and connection pool
+    come from the process-wide registry in agents.client_registry.
+    """
     if 'analysis_agent' not in st.session_state:
         st.session_state.analysis_agent = AnalysisAgent()
 
-def generate_analysis(data, system_prompt, check_only=False, session_id=None):
-    """Generate analysis if within rate limits."""
+def generate_analysis(data, system_prompt, check_only=False, session_id=None, stream=False, on_queue=None):
+    """Generate analysis if within the current user's rate limits.
+
+    With stream=True the result carries an AnalysisStream under "stream"
+    instead of the finished "content". on_queue(position, eta_seconds) is
+    called while the request waits for a free analysis slot.
+    """
     # Ensure analysis agent is initialized
     init_analysis_state()
     
+    user = st.session_state.get('user') or {}
+    user_id = user.get('id')
+
     # For check_only, we just need to check rate limits
     if check_only:
-        return st.session_state.analysis_agent.check_rate_limit()
+        return st.session_state.analysis_agent.check_rate_limit(user_id)
     
     # Get chat history if needed
     # Don't pass chat_history for now as it's causing issues
@@ -27,5 +39,8 @@ def generate_analysis(data, system_prompt, check_only=False, session_id=None):
     return st.session_state.analysis_agent.analyze_report(
         data=data,
         system_prompt=system_prompt,
-        check_only=False
+        check_only=False,
+        stream=stream,
+        user_id=user_id,
+        on_queue=on_queue
     )
\ No newline at end of file
@@ -0,0 +1,220 @@
+"""Analyze a directory of PDF reports without the Streamlit UI.
+
+Each report goes through the same pipeline as the analysis form: text and
+table extraction, AnalysisAgent.analyze_report and create_analysis_pdf.
+Results are written as <name>.md and <name>.pdf next to a manifest.jsonl
+that records status and timings per file. The manifest doubles as the
+checkpoint: rerunning the command skips files already analyzed.
+
+Usage (run from the src directory; GROQ_API_KEY is read from the environment
+or .streamlit/secrets.toml):
+    python -m tools.batch_analyze reports/ --out results/ --workers 4 --rpm 30
+"""
+import argparse
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from agents.analysis_agent import AnalysisAgent
+from config.prompts import SPECIALIST_PROMPTS
+from utils.lab_parser import build_report_prompt
+from utils.pdf_exporter import create_analysis_pdf
+from utils.pdf_extractor import extract_text_from_pdf, extract_tables_from_pdf, is_extraction_error
+
+MANIFEST_NAME = "manifest.jsonl"
+
+
+class LocalPdfFile:
+    """Minimal stand-in for a Streamlit UploadedFile backed by a local file."""
+
+    type = "application/pdf"
+
+    def __init__(self, path):
+        self.name = os.path.basename(path)
+        with open(path, "rb") as f:
+            self._data = f.read()
+        self.size = len(self._data)
+        self._position = 0
+
+    def getvalue(self):
+        return self._data
+
+    def read(self):
+        data = self._data[self._position:]
+        self._position = self.size
+        return data
+
+    def seek(self, position):
+        self._position = position
+
+
+class StartRateLimiter:
+    """Token bucket shared by all workers: at most rpm starts per minute."""
+
+    def __init__(self, rpm, burst=1):
+        self.interval = 60.0 / rpm if rpm else 0.0
+        self.capacity = max(1, burst)
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a request may start."""
+        if not self.interval:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) / self.interval)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) * self.interval
+            time.sleep(wait)
+
+
+class Manifest:
+    """Append-only JSONL log of processed files, used to resume a batch."""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self.completed = set()
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue  # Partial line from an interrupted run
+                    if entry.get("status") == "ok":
+                        self.completed.add(entry["sha256"])
+
+    def append(self, entry):
+        line = json.dumps(entry, ensure_ascii=False)
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            if entry.get("status") == "ok":
+                self.completed.add(entry["sha256"])
+
+
+def analyze_file(path, stem, out_dir, agent, limiter, mode):
+    """Run one PDF through extraction, analysis and export; return a manifest entry."""
+    started = time.perf_counter()
+    pdf_file = LocalPdfFile(path)
+    entry = {
+        "file": path,
+        "sha256": hashlib.sha256(pdf_file.getvalue()).hexdigest(),
+        "status": "error",
+    }
+    try:
+        text = extract_text_from_pdf(pdf_file)
+        if is_extraction_error(text):
+            # Scanned, over-limit or non-report PDFs: recorded as errors, never sent to the model
+            entry["error"] = str(text)
+            return entry
+        payload = build_report_prompt(text, extract_tables_from_pdf(pdf_file))
+        entry["extract_s"] = round(time.perf_counter() - started, 3)
+
+        limiter.acquire()
+        analyze_started = time.perf_counter()
+        result = agent.analyze_report(
+            {"report": payload}, SPECIALIST_PROMPTS["comprehensive_analyst"], mode=mode
+        )
+        entry["analyze_s"] = round(time.perf_counter() - analyze_started, 3)
+        if not result["success"]:
+            entry["error"] = result["error"]
+            return entry
+
+        export_started = time.perf_counter()
+        markdown_path = os.path.join(out_dir, f"{stem}.md")
+        pdf_path = os.path.join(out_dir, f"{stem}.pdf")
+        with open(markdown_path, "w", encoding="utf-8") as f:
+            f.write(result["content"])
+        with open(pdf_path, "wb") as f:
+            f.write(create_analysis_pdf(result["content"]))
+        entry["export_s"] = round(time.perf_counter() - export_started, 3)
+
+        entry.update({
+            "status": "ok",
+            "model_used": result.get("model_used"),
+            "cached": bool(result.get("cached")),
+            "markdown": markdown_path,
+            "pdf": pdf_path,
+        })
+        return entry
+    except Exception as e:
+        entry["error"] = str(e)
+        return entry
+    finally:
+        entry["total_s"] = round(time.perf_counter() - started, 3)
+
+
+def find_pdfs(directory):
+    return sorted(
+        os.path.join(root, name)
+        for root, _, names in os.walk(directory)
+        for name in names
+        if name.lower().endswith(".pdf")
+    )
+
+
+def output_stem(path, input_dir):
+    """Output name derived from the path relative to input_dir, so equal names in subdirectories do not collide."""
+    relative = os.path.splitext(os.path.relpath(path, input_dir))[0]
+    return relative.replace(os.sep, "__")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Batch-analyze a directory of PDF reports.")
+    parser.add_argument("input_dir", help="directory searched recursively for PDF files")
+    parser.add_argument("--out", default="batch_output", help="output directory")
+    parser.add_argument("--workers", type=int, default=4, help="reports processed concurrently")
+    parser.add_argument("--rpm", type=float, default=30, help="analyses started per minute (0 = unlimited)")
+    parser.add_argument(
+        "--mode",
+        choices=["auto", "single", "map_reduce"],
+        default=None,
+        help="analysis mode (default: ANALYSIS_MODE from config)",
+    )
+    args = parser.parse_args(argv)
+
+    os.makedirs(args.out, exist_ok=True)
+    manifest = Manifest(os.path.join(args.out, MANIFEST_NAME))
+    pending = []
+    for path in find_pdfs(args.input_dir):
+        with open(path, "rb") as f:
+            digest = hashlib.sha256(f.read()).hexdigest()
+        if digest not in manifest.completed:
+            pending.append(path)
+    print(f"{len(pending)} to analyze, {len(manifest.completed)} already done")
+
+    agent = AnalysisAgent()
+    limiter = StartRateLimiter(args.rpm)
+    failures = 0
+    with ThreadPoolExecutor(max_workers=max(1, args.workers)) as executor:
+        futures = [
+            executor.submit(analyze_file, path, output_stem(path, args.input_dir), args.out, agent, limiter, args.mode)
+            for path in pending
+        ]
+        for done, future in enumerate(as_completed(futures), 1):
+            entry = future.result()
+            manifest.append(entry)
+            if entry["status"] != "ok":
+                failures += 1
+            detail = entry.get("model_used") or entry.get("error", "")
+            print(f"[{done}/{len(pending)}] {entry['status']:<5} {entry['total_s']:>7.1f}s {entry['file']} {detail}")
+
+    print(f"finished: {len(pending) - failures} ok, {failures} failed")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
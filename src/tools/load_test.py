@@ -0,0 +1,142 @@
+"""Drive AnalysisAgent.analyze_report at a fixed concurrency and report latency.
+
+Intended to run against tools.mock_groq_server. Every request gets a unique
+report (a numbered trailer line) so the response cache does not absorb the
+load; pass --allow-cache-hits to measure the cached path instead.
+
+Usage (run from the src directory, with the mock server running):
+    python -m tools.load_test --base-url http://127.0.0.1:8765 --concurrency 16 --requests 200
+    python -m tools.load_test --concurrency 8 --requests 50 --stream --mode map_reduce
+"""
+import argparse
+import math
+import os
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from agents.analysis_agent import AnalysisAgent
+from agents.hedging import get_hedge_budget
+from agents.model_manager import ModelManager
+from agents.model_router import get_model_router
+from agents.resilience import get_breaker_board
+from config.prompts import SPECIALIST_PROMPTS
+from config.sample_data import SAMPLE_REPORT
+
+
+def percentile(samples, fraction):
+    """Nearest-rank percentile of an unsorted list; None when empty."""
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+
+def run_one(agent, models, quality, report, system_prompt, stream, mode):
+    """Run one analysis and return its measurements."""
+    expected = get_model_router().order(models, quality)[0]
+    started = time.perf_counter()
+    result = agent.analyze_report({"report": report}, system_prompt, stream=stream, mode=mode)
+    first_output = time.perf_counter() - started
+    if result["success"] and result.get("stream") is not None:
+        analysis_stream = result["stream"]
+        for _ in analysis_stream:
+            pass
+        if analysis_stream.error:
+            result = {"success": False, "error": analysis_stream.error}
+    model_used = result.get("model_used") or ""
+    return {
+        "success": result["success"],
+        "latency": time.perf_counter() - started,
+        "first_output": first_output,
+        "model": model_used,
+        "cached": bool(result.get("cached")),
+        "fallback": result["success"] and not result.get("cached") and not model_used.endswith(f"/{expected}"),
+        "error": result.get("error"),
+    }
+
+
+def format_seconds(value):
+    return "-" if value is None else f"{value:.2f}s"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load-test the analysis pipeline.")
+    parser.add_argument("--base-url", default="http://127.0.0.1:8765", help="Groq-compatible API base URL")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--report", help="report text file (default: the bundled sample report)")
+    parser.add_argument("--stream", action="store_true", help="use streaming responses")
+    parser.add_argument("--mode", choices=["auto", "single", "map_reduce"], default="single")
+    parser.add_argument("--allow-cache-hits", action="store_true", help="send the same report every time")
+    args = parser.parse_args(argv)
+
+    # The shared client reads these when it is first created
+    os.environ["GROQ_BASE_URL"] = args.base_url
+    os.environ.setdefault("GROQ_API_KEY", "mock-key")
+
+    if args.report:
+        with open(args.report, encoding="utf-8") as f:
+            base_report = f.read()
+    else:
+        base_report = SAMPLE_REPORT
+
+    agent = AnalysisAgent()
+    system_prompt = SPECIALIST_PROMPTS["comprehensive_analyst"]
+    counter = iter(range(args.requests))
+    counter_lock = threading.Lock()
+    results = []
+    results_lock = threading.Lock()
+
+    def worker():
+        while True:
+            with counter_lock:
+                index = next(counter, None)
+            if index is None:
+                return
+            report = base_report if args.allow_cache_hits else f"{base_report}\n压测请求编号 {index}"
+            measurement = run_one(
+                agent, ModelManager.MODELS, ModelManager.MODEL_QUALITY,
+                report, system_prompt, args.stream, args.mode,
+            )
+            with results_lock:
+                results.append(measurement)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        for _ in range(args.concurrency):
+            executor.submit(worker)
+    elapsed = time.perf_counter() - started
+
+    succeeded = [r for r in results if r["success"]]
+    latencies = [r["latency"] for r in succeeded]
+    first_outputs = [r["first_output"] for r in succeeded]
+    print(f"requests     {len(results)} in {elapsed:.1f}s at concurrency {args.concurrency}")
+    print(f"throughput   {len(succeeded) / elapsed:.2f} successful analyses/s")
+    print(f"success      {len(succeeded)}/{len(results)}")
+    print(
+        f"latency      p50 {format_seconds(percentile(latencies, 0.5))}"
+        f"  p95 {format_seconds(percentile(latencies, 0.95))}"
+        f"  p99 {format_seconds(percentile(latencies, 0.99))}"
+    )
+    if args.stream:
+        print(
+            f"first token  p50 {format_seconds(percentile(first_outputs, 0.5))}"
+            f"  p95 {format_seconds(percentile(first_outputs, 0.95))}"
+            f"  p99 {format_seconds(percentile(first_outputs, 0.99))}"
+        )
+    fallbacks = sum(1 for r in succeeded if r["fallback"])
+    print(f"fallback     {fallbacks / len(succeeded):.1%} of successes" if succeeded else "fallback     -")
+    print(f"cache hits   {sum(1 for r in succeeded if r['cached'])}")
+    print(f"hedging      {get_hedge_budget().stats()}")
+    for model, count in Counter(r["model"] for r in succeeded).most_common():
+        print(f"  {count:>5}  {model}")
+    for error, count in Counter(r["error"] for r in results if not r["success"]).most_common(5):
+        print(f"  error x{count}: {error}")
+    print(f"breakers     {get_breaker_board().snapshot()}")
+    return 0 if succeeded else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,304 @@
+"""Local stand-in for the Groq (OpenAI-compatible) chat completions API.
+
+Serves POST /openai/v1/chat/completions with synthetic latency, injected
+429/5xx errors and SSE streaming, so ModelManager can be load-tested without
+quota or network access. GET /stats returns request counters.
+
+Latency specs: "fixed:2", "uniform:1,4", "lognormal:MEDIAN,SIGMA" (seconds).
+Point the app at the server with GROQ_BASE_URL=http://127.0.0.1:8765.
+
+Usage (run from the src directory):
+    python -m tools.mock_groq_server --latency lognormal:3,0.6 --error-429 0.05
+    python -m tools.mock_groq_server --model llama-3.1-8b-instant=fixed:1 --error-5xx 0.02
+
+Record real responses once, then replay them offline:
+    python -m tools.mock_groq_server --upstream https://api.groq.com --record calls.jsonl
+    python -m tools.mock_groq_server --replay calls.jsonl
+"""
+import argparse
+import hashlib
+import json
+import math
+import random
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from utils.token_estimator import estimate_tokens
+
+COMPLETIONS_PATH = "/openai/v1/chat/completions"
+SYNTHETIC_REPORT = """### 体检报告
+
+#### 🩸 血液检查
+| 项目 | 检测结果 | 单位 | 说明 |
+| :--- | :--- | :--- | :--- |
+| 白细胞 | 11.2 | x10^9/L | 增多 |
+
+### 建议
+| 维度 | 建议内容 |
+| :--- | :--- |
+| 饮食 | 均衡饮食，减少高脂食物 |
+
+### ⚠️ 免责声明
+此分析由人工智能生成，不应被视为专业医疗建议的替代品。
+"""
+
+
+def parse_latency(spec):
+    """Turn a latency spec string into a zero-argument sampler returning seconds."""
+    kind, _, params = spec.partition(":")
+    values = [float(value) for value in params.split(",") if value]
+    if kind == "fixed":
+        return lambda: values[0]
+    if kind == "uniform":
+        return lambda: random.uniform(values[0], values[1])
+    if kind == "lognormal":
+        median, sigma = values
+        return lambda: random.lognormvariate(math.log(median), sigma)
+    raise ValueError(f"unknown latency spec: {spec}")
+
+
+def request_key(body):
+    """Replay key: the model and messages of a request."""
+    payload = json.dumps([body.get("model"), body.get("messages")], ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class MockState:
+    """Server configuration, recorded responses and counters shared by handler threads."""
+
+    def __init__(self, args):
+        self.default_latency = parse_latency(args.latency)
+        self.model_latency = {}
+        for item in args.model or []:
+            model, _, spec = item.partition("=")
+            self.model_latency[model] = parse_latency(spec)
+        self.ttft_ratio = args.ttft_ratio
+        self.error_429 = args.error_429
+        self.error_5xx = args.error_5xx
+        self.retry_after = args.retry_after
+        self.chunk_chars = args.chunk_chars
+        self.upstream = args.upstream.rstrip("/") if args.upstream else None
+        self.record_path = args.record
+        self.recorded = {}
+        if args.replay:
+            with open(args.replay, encoding="utf-8") as f:
+                for line in f:
+                    entry = json.loads(line)
+                    self.recorded[entry["key"]] = entry
+        self._lock = threading.Lock()
+        self.counters = {"requests": 0, "streamed": 0, "replayed": 0, "recorded": 0, "429": 0, "5xx": 0}
+
+    def count(self, name):
+        with self._lock:
+            self.counters[name] += 1
+
+    def latency_for(self, model):
+        return max(0.0, self.model_latency.get(model, self.default_latency)())
+
+    def record(self, entry):
+        with self._lock:
+            self.recorded[entry["key"]] = entry
+            self.counters["recorded"] += 1
+            if self.record_path:
+                with open(self.record_path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+
+class MockGroqHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # Keep-alive, as the real API offers
+    state = None
+
+    def log_message(self, format, *args):
+        pass  # Per-request access logs would drown out load-test output
+
+    def do_GET(self):
+        if self.path != "/stats":
+            self._send_json(404, {"error": {"message": "not found"}})
+            return
+        self._send_json(200, self.state.counters)
+
+    def do_POST(self):
+        if self.path != COMPLETIONS_PATH:
+            self._send_json(404, {"error": {"message": "not found"}})
+            return
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        state = self.state
+        state.count("requests")
+        model = body.get("model", "mock-model")
+
+        roll = random.random()
+        if roll < state.error_429:
+            state.count("429")
+            self._send_json(
+                429,
+                {"error": {"message": "Rate limit reached (mock)", "type": "rate_limit_exceeded"}},
+                {"retry-after": str(state.retry_after)},
+            )
+            return
+        if roll < state.error_429 + state.error_5xx:
+            state.count("5xx")
+            self._send_json(random.choice([500, 502, 503]), {"error": {"message": "Upstream error (mock)"}})
+            return
+
+        started = time.perf_counter()
+        try:
+            content, usage = self._completion(body)
+        except urllib.error.HTTPError as e:
+            # Pass upstream errors (including real 429s) through unchanged
+            self._send_json(e.code, json.loads(e.read() or b"{}"), {
+                name: value for name, value in e.headers.items() if name.lower().startswith("retry-after")
+            })
+            return
+        remaining = state.latency_for(model) - (time.perf_counter() - started)
+        if body.get("stream"):
+            state.count("streamed")
+            self._send_stream(model, content, usage, max(0.0, remaining))
+        else:
+            time.sleep(max(0.0, remaining))
+            self._send_json(200, {
+                "id": f"chatcmpl-{uuid.uuid4().hex}",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": content},
+                    "finish_reason": "stop",
+                }],
+                "usage": usage,
+            })
+
+    def _completion(self, body):
+        """Return (content, usage) from a recording, the upstream API, or the synthetic report."""
+        state = self.state
+        key = request_key(body)
+        entry = state.recorded.get(key)
+        if entry:
+            state.count("replayed")
+            return entry["content"], entry["usage"]
+        if state.upstream:
+            content, usage = self._forward(body)
+            state.record({"key": key, "model": body.get("model"), "content": content, "usage": usage})
+            return content, usage
+
+        prompt = "".join(str(message.get("content", "")) for message in body.get("messages", []))
+        content = SYNTHETIC_REPORT
+        prompt_tokens = estimate_tokens(prompt)
+        completion_tokens = estimate_tokens(content)
+        return content, {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        }
+
+    def _forward(self, body):
+        """Call the real API without streaming and return its content and usage."""
+        request = urllib.request.Request(
+            self.state.upstream + COMPLETIONS_PATH,
+            data=json.dumps({**body, "stream": False}).encode("utf-8"),
+            headers={
+                "Content-Type": "application/json",
+                "Authorization": self.headers.get("Authorization", ""),
+            },
+            method="POST",
+        )
+        with urllib.request.urlopen(request, timeout=120) as response:
+            payload = json.loads(response.read())
+        return payload["choices"][0]["message"]["content"], payload.get("usage")
+
+    def _send_json(self, status, payload, headers=None):
+        data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_stream(self, model, content, usage, latency):
+        """Send content as SSE chunks: first token after ttft_ratio of the latency, the rest spread evenly."""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+        pieces = [content[i:i + self.state.chunk_chars] for i in range(0, len(content), self.state.chunk_chars)]
+        first_delay = latency * self.state.ttft_ratio
+        step = (latency - first_delay) / max(1, len(pieces) - 1)
+        time.sleep(first_delay)
+        try:
+            for index, piece in enumerate(pieces):
+                if index:
+                    time.sleep(step)
+                self._write_event(self._chunk(completion_id, model, {"content": piece}, None))
+            final = self._chunk(completion_id, model, {}, "stop")
+            final["x_groq"] = {"id": completion_id, "usage": usage}
+            self._write_event(final)
+            self._write_chunk(b"data: [DONE]\n\n")
+            self._write_chunk(b"")
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True  # Client cancelled, e.g. a losing hedged request
+
+    @staticmethod
+    def _chunk(completion_id, model, delta, finish_reason):
+        return {
+            "id": completion_id,
+            "object": "chat.completion.chunk",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+        }
+
+    def _write_event(self, payload):
+        self._write_chunk(f"data: {json.dumps(payload, ensure_ascii=False)}\n\n".encode("utf-8"))
+
+    def _write_chunk(self, data):
+        self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Run a local mock of the Groq chat completions API.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", default="lognormal:3,0.5", help="default latency spec")
+    parser.add_argument("--model", action="append", metavar="MODEL=SPEC", help="per-model latency spec")
+    parser.add_argument("--ttft-ratio", type=float, default=0.2, help="share of latency before the first streamed token")
+    parser.add_argument("--error-429", type=float, default=0.0, help="probability of a 429 response")
+    parser.add_argument("--error-5xx", type=float, default=0.0, help="probability of a 5xx response")
+    parser.add_argument("--retry-after", type=float, default=2.0, help="Retry-After seconds sent with 429s")
+    parser.add_argument("--chunk-chars", type=int, default=16, help="characters per streamed chunk")
+    parser.add_argument("--upstream", help="forward unrecorded requests to this API base URL")
+    parser.add_argument("--record", help="append forwarded responses to this JSONL file")
+    parser.add_argument("--replay", help="serve responses recorded in this JSONL file")
+    return parser
+
+
+def serve(args):
+    """Create the server without starting it, so callers can run it in a background thread."""
+    handler = type("Handler", (MockGroqHandler,), {"state": MockState(args)})
+    server = ThreadingHTTPServer((args.host, args.port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    server = serve(args)
+    print(f"mock Groq API on http://{args.host}:{args.port} (GROQ_BASE_URL)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""Compare PDF text extraction backends on multi-page reports.
+
+Usage (run from the src directory):
+    python -m tools.pdf_benchmark report1.pdf report2.pdf --repeat 3
+"""
+import argparse
+import statistics
+import time
+
+from utils.pdf_backends import BACKENDS
+
+
+def benchmark_backend(backend, pdf_bytes, repeat):
+    """Extract every page repeat times and return timing statistics."""
+    timings = []
+    chars = 0
+    pages = 0
+    fallback_pages = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        with backend.open(pdf_bytes) as document:
+            pages = len(document)
+            chars = sum(len(document.extract_page(index)) for index in range(pages))
+            fallback_pages = getattr(document, "fallback_pages", 0)
+        timings.append(time.perf_counter() - start)
+    median = statistics.median(timings)
+    return {
+        "pages": pages,
+        "chars": chars,
+        "median_s": median,
+        "pages_per_s": pages / median if median else float("inf"),
+        "fallback_pages": fallback_pages,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark PDF text extraction backends.")
+    parser.add_argument("pdfs", nargs="+", help="PDF files to extract")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per backend and file")
+    parser.add_argument(
+        "--backends",
+        nargs="+",
+        default=list(BACKENDS),
+        choices=list(BACKENDS),
+        help="backends to compare",
+    )
+    args = parser.parse_args(argv)
+
+    header = f"{'file':<32} {'backend':<12} {'pages':>5} {'chars':>8} {'median s':>9} {'pages/s':>8} {'fallback':>8}"
+    print(header)
+    print("-" * len(header))
+    for path in args.pdfs:
+        with open(path, "rb") as f:
+            pdf_bytes = f.read()
+        for name in args.backends:
+            result = benchmark_backend(BACKENDS[name], pdf_bytes, args.repeat)
+            print(
+                f"{path[-32:]:<32} {name:<12} {result['pages']:>5} {result['chars']:>8} "
+                f"{result['median_s']:>9.3f} {result['pages_per_s']:>8.1f} {result['fallback_pages']:>8}"
+            )
+
+
+if __name__ == "__main__":
+    main()
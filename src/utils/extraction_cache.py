@@ -0,0 +1,231 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from config.app_config import PDF_CACHE_MAX_ENTRIES, PDF_CACHE_DIR
+
+
+def make_cache_key(data, *parts):
+    """Build a content-addressed cache key.
+
+    The key is the SHA-256 of the raw bytes, salted with any extra parts
+    (extractor version, page limit, ...) so that a config change never
+    serves a stale result.
+    """
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(str(part).encode("utf-8"))
+        digest.update(b"\0")
+    digest.update(data)
+    return digest.hexdigest()
+
+
+class ExtractionCache:
+    """Two-tier cache for PDF extraction results.
+
+    - Memory tier: bounded LRU, private to the current process.
+    - Disk tier (optional): one JSON file per key in a shared directory, so
+      several server processes parse the same report only once.
+
+    Values must be JSON serializable.
+    """
+
+    LOCK_STALE_SECONDS = 120  # 超过该时长的锁文件视为持有进程已崩溃
+    LOCK_POLL_SECONDS = 0.1
+
+    def __init__(self, max_entries=64, cache_dir=None):
+        self.max_entries = max_entries
+        self.cache_dir = cache_dir
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._key_locks = {}  # key -> [lock, number of callers using it]
+        self.hits = 0
+        self.misses = 0
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    def get(self, key):
+        """Return the cached value or None, checking memory then disk."""
+        return self._lookup(key, count=True)
+
+    def set(self, key, value):
+        """Store a value in both tiers."""
+        with self._lock:
+            self._store_memory(key, value)
+        self._write_disk(key, value)
+
+    def get_or_compute(self, key, compute, should_cache=None):
+        """Return the cached value for key, computing it at most once.
+
+        Concurrent callers in this process wait on a per-key lock; callers in
+        other processes wait on a lock file in the disk tier.
+        should_cache(value) may veto caching of transient results.
+        """
+        value = self.get(key)
+        if value is not None:
+            return value
+
+        with self._key_lock(key):
+            value = self._lookup(key, count=False)
+            if value is not None:
+                return value
+
+            with self._disk_lock(key):
+                # 可能在等待锁期间已由其他进程写入
+                value = self._read_disk(key)
+                if value is not None:
+                    with self._lock:
+                        self._store_memory(key, value)
+                    return value
+
+                value = compute()
+                if value is not None and (should_cache is None or should_cache(value)):
+                    self.set(key, value)
+                return value
+
+    def clear(self):
+        """Drop the memory tier (the disk tier is left untouched)."""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """Return hit/miss counters for monitoring."""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "disk_enabled": bool(self.cache_dir),
+            }
+
+    def _lookup(self, key, count):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                if count:
+                    self.hits += 1
+                return self._entries[key]
+
+        value = self._read_disk(key)
+        with self._lock:
+            if value is not None:
+                self._store_memory(key, value)
+            if count:
+                if value is not None:
+                    self.hits += 1
+                else:
+                    self.misses += 1
+        return value
+
+    def _store_memory(self, key, value):
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    @contextmanager
+    def _key_lock(self, key):
+        """Hold the per-key lock; it is dropped once no caller uses it."""
+        with self._lock:
+            entry = self._key_locks.get(key)
+            if entry is None:
+                entry = self._key_locks[key] = [threading.Lock(), 0]
+            entry[1] += 1
+        try:
+            with entry[0]:
+                yield
+        finally:
+            with self._lock:
+                entry[1] -= 1
+                if not entry[1]:
+                    del self._key_locks[key]
+
+    def _path(self, key, suffix=".json"):
+        return os.path.join(self.cache_dir, key + suffix)
+
+    def _read_disk(self, key):
+        if not self.cache_dir:
+            return None
+        try:
+            with open(self._path(key), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write_disk(self, key, value):
+        if not self.cache_dir:
+            return
+        try:
+            # 先写临时文件再原子替换，避免其他进程读到半截内容
+            fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(value, f, ensure_ascii=False)
+            os.replace(tmp_path, self._path(key))
+        except OSError:
+            pass  # 磁盘层写入失败不影响正常返回
+
+    def _disk_lock(self, key):
+        return _LockFile(self._path(key, ".lock") if self.cache_dir else None,
+                         self.LOCK_STALE_SECONDS, self.LOCK_POLL_SECONDS)
+
+
+class _LockFile:
+    """Portable cross-process lock based on O_EXCL file creation."""
+
+    def __init__(self, path, stale_seconds, poll_seconds):
+        self.path = path
+        self.stale_seconds = stale_seconds
+        self.poll_seconds = poll_seconds
+        self.acquired = False
+
+    def __enter__(self):
+        if not self.path:
+            return self
+        deadline = time.time() + self.stale_seconds
+        while True:
+            try:
+                fd = os.open(self.path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+                os.close(fd)
+                self.acquired = True
+                return self
+            except FileExistsError:
+                try:
+                    if time.time() - os.path.getmtime(self.path) > self.stale_seconds:
+                        os.remove(self.path)
+                        continue
+                except OSError:
+                    continue
+                if time.time() > deadline:
+                    return self  # 等待超时则放弃加锁，退化为各自解析
+                time.sleep(self.poll_seconds)
+            except OSError:
+                return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self.acquired:
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
+        return False
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_extraction_cache():
+    """Return the process-wide extraction cache configured from app_config."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = ExtractionCache(PDF_CACHE_MAX_ENTRIES, PDF_CACHE_DIR)
+    return _cache
@@ -0,0 +1,308 @@
+import re
+from dataclasses import dataclass, field
+
+# Section headings such as "--- 血液检查 ---", "【血常规】" or "二、尿液检查"
+_SECTION_PATTERNS = [
+    re.compile(r"^-{2,}\s*(.+?)\s*-{2,}$"),
+    re.compile(r"^[【\[]\s*(.+?)\s*[】\]]$"),
+    re.compile(r"^[一二三四五六七八九十]+\s*[、.．]\s*(.+)$"),
+]
+_SECTION_SUFFIXES = ("检查", "检验", "常规", "功能", "全套", "指标")
+
+# A standalone measurement: number, ratio (170/100) or qualitative result
+_VALUE_PATTERN = re.compile(
+    r"(?:(?<=\s)|(?<=[:：])|^)"
+    r"(?P<value>[<>≤≥]?[-+]?\d+(?:\.\d+)?(?:/\d+(?:\.\d+)?)?|\+{1,4}|[-±]|阴性|阳性|弱阳性|negative|positive)"
+    r"(?=\s|$)",
+    re.IGNORECASE,
+)
+_RANGE_PATTERN = re.compile(
+    r"[<>≤≥]\s*\d+(?:\.\d+)?|\d+(?:\.\d+)?\s*[-~–—]\s*\d+(?:\.\d+)?"
+)
+_FLAG_PATTERN = re.compile(r"[↑↓]|(?<!\S)[HL](?!\S)")
+_UNIT_TOKEN_PATTERN = re.compile(r"^[A-Za-zµμ%/^×*·.\-\d²³]*[A-Za-zµμ%][A-Za-zµμ%/^×*·.\-\d²³]*$|^x$")
+_HAS_WORD_PATTERN = re.compile(r"[A-Za-z一-鿿]")
+
+# Header keywords used to map pdfplumber table columns to fields
+_TABLE_COLUMNS = {
+    "analyte": ("项目", "名称", "test", "item", "analyte"),
+    "value": ("结果", "result", "value"),
+    "unit": ("单位", "unit"),
+    "reference_range": ("参考", "范围", "reference", "range"),
+    "flag": ("提示", "标记", "标志", "flag"),
+}
+
+# Heading for table rows whose analyte never appears in the report text
+UNMATCHED_TABLE_SECTION = "表格"
+
+PROMPT_HEADER = "# 项目|结果|单位|参考范围|标记"
+
+
+@dataclass
+class LabResult:
+    """A single measured analyte from a lab report."""
+
+    analyte: str
+    value: str
+    unit: str = ""
+    reference_range: str = ""
+    flag: str = ""
+    section: str = ""
+
+    def to_row(self):
+        """Compact pipe-separated row with trailing empty columns dropped."""
+        cells = [self.analyte, self.value, self.unit, self.reference_range, self.flag]
+        while cells and not cells[-1]:
+            cells.pop()
+        return "|".join(cells)
+
+
+@dataclass
+class ParsedReport:
+    """Lab results and free-text notes grouped by report section.
+
+    Each section keeps its entries in report order; an entry is either a
+    LabResult or a free-text line (imaging findings, personal info, ...).
+    """
+
+    sections: dict = field(default_factory=dict)
+
+    @property
+    def records(self):
+        return [
+            entry
+            for entries in self.sections.values()
+            for entry in entries
+            if isinstance(entry, LabResult)
+        ]
+
+    def add(self, section, entry):
+        self.sections.setdefault(section, []).append(entry)
+
+
+def _section_title(line):
+    """Return the section name if the line is a section heading."""
+    for pattern in _SECTION_PATTERNS:
+        match = pattern.match(line)
+        if match:
+            return match.group(1).strip()
+    if len(line) <= 20 and line.endswith(_SECTION_SUFFIXES) and not re.search(r"[\d:：]", line):
+        return line
+    return None
+
+
+def _normalize_analyte(name):
+    return re.sub(r"\s+", "", name).lower()
+
+
+def parse_result_line(line, section=""):
+    """Parse one line of report text into a LabResult, or None for free text."""
+    if "\t" in line:
+        cells = [cell.strip() for cell in line.split("\t")]
+        if len(cells) >= 2 and _HAS_WORD_PATTERN.search(cells[0]) and _VALUE_PATTERN.fullmatch(cells[1]):
+            return LabResult(
+                analyte=cells[0],
+                value=cells[1],
+                unit=cells[2] if len(cells) > 2 else "",
+                reference_range=cells[3] if len(cells) > 3 else "",
+                section=section,
+            )
+        line = " ".join(cells)
+
+    match = _VALUE_PATTERN.search(line)
+    if not match:
+        return None
+    analyte = line[:match.start()].strip(" :：")
+    if len(analyte) < 2 or not _HAS_WORD_PATTERN.search(analyte) or re.search(r"[,，;；]", analyte):
+        return None
+
+    rest = line[match.end():]
+    reference_range = ""
+    range_match = _RANGE_PATTERN.search(rest)
+    if range_match:
+        reference_range = re.sub(r"\s+", "", range_match.group(0))
+        rest = rest[:range_match.start()] + " " + rest[range_match.end():]
+    flag = ""
+    flag_match = _FLAG_PATTERN.search(rest)
+    if flag_match:
+        flag = flag_match.group(0)
+        rest = rest[:flag_match.start()] + " " + rest[flag_match.end():]
+
+    unit_tokens = rest.split()
+    if not all(_UNIT_TOKEN_PATTERN.match(token) for token in unit_tokens):
+        return None  # e.g. "尿蛋白 ++, 尿糖 +++": keep the line verbatim as a note
+
+    return LabResult(
+        analyte=analyte,
+        value=match.group("value"),
+        unit=" ".join(unit_tokens),
+        reference_range=reference_range,
+        flag=flag,
+        section=section,
+    )
+
+
+def _map_table_columns(header):
+    """Map field names to column indexes from a table header row."""
+    columns = {}
+    for index, cell in enumerate(header):
+        text = (cell or "").strip().lower()
+        for name, keywords in _TABLE_COLUMNS.items():
+            if name not in columns and any(keyword in text for keyword in keywords):
+                columns[name] = index
+                break
+    if "analyte" in columns and "value" in columns:
+        return columns
+    return None
+
+
+def parse_tables(tables, section=""):
+    """Convert pdfplumber extract_tables() output into LabResults."""
+    results = []
+    for table in tables or []:
+        rows = [[(cell or "").strip() for cell in row] for row in table if row]
+        if not rows:
+            continue
+        columns = _map_table_columns(rows[0])
+        if columns:
+            rows = rows[1:]
+        else:
+            columns = {"analyte": 0, "value": 1, "unit": 2, "reference_range": 3}
+
+        for row in rows:
+            def cell(name):
+                index = columns.get(name)
+                return row[index] if index is not None and index < len(row) else ""
+
+            analyte, value = cell("analyte"), cell("value")
+            if not analyte or not value or not _HAS_WORD_PATTERN.search(analyte):
+                continue
+            flag = cell("flag")
+            flag_match = _FLAG_PATTERN.search(value)
+            if flag_match:
+                # "11.2↑": keep the arrow as the flag, not part of the value
+                flag = flag or flag_match.group(0)
+                value = (value[:flag_match.start()] + value[flag_match.end():]).strip()
+            results.append(LabResult(
+                analyte=" ".join(analyte.split()),
+                value=value,
+                unit=cell("unit"),
+                reference_range=cell("reference_range"),
+                flag=flag,
+                section=section,
+            ))
+    return results
+
+
+def _take_table_result(table_results, analyte, section, flag):
+    """Pop the next table row for an analyte, placed in the text's section.
+
+    The table keeps the column layout intact, so its value, unit and range
+    win; the section and a missing flag come from the text line.
+    """
+    queue = table_results.get(_normalize_analyte(analyte))
+    if not queue:
+        return None
+    result = queue.pop(0)
+    result.section = section
+    result.flag = result.flag or flag
+    return result
+
+
+def _table_analyte_prefix(line, table_results):
+    """Longest table analyte that a free-text line starts with, if any.
+
+    Sentences ("白细胞偏高，建议复查") are notes, not garbled rows, and stay.
+    """
+    if re.search(r"[,，;；。]", line):
+        return None
+    normalized = _normalize_analyte(line)
+    matches = [key for key, queue in table_results.items() if queue and normalized.startswith(key)]
+    return max(matches, key=len) if matches else None
+
+
+def parse_lab_report(text, tables=None):
+    """Parse report text (and optional pdfplumber tables) into a ParsedReport.
+
+    Table rows replace the text lines describing the same analyte, in the
+    section and position where the analyte appears in the text. Table rows
+    whose analyte is not found in the text are collected in a trailing
+    UNMATCHED_TABLE_SECTION.
+    """
+    report = ParsedReport()
+    table_results = {}
+    for result in parse_tables(tables):
+        table_results.setdefault(_normalize_analyte(result.analyte), []).append(result)
+
+    section = ""
+    for raw_line in (text or "").splitlines():
+        line = " ".join(raw_line.split())
+        if not line:
+            continue
+        title = _section_title(line)
+        if title:
+            section = title
+            continue
+        if _map_table_columns(line.split()) and not _VALUE_PATTERN.search(line):
+            continue  # Column header rows are covered by PROMPT_HEADER
+        result = parse_result_line(raw_line.strip(), section)
+        if result is not None:
+            report.add(section, _take_table_result(table_results, result.analyte, section, result.flag) or result)
+            continue
+        # Text extraction can garble a table row into a line that no longer
+        # parses; the table row still belongs here if the line names its analyte
+        key = _table_analyte_prefix(line, table_results)
+        if key:
+            flag_match = _FLAG_PATTERN.search(line)
+            table_result = _take_table_result(table_results, key, section, flag_match.group(0) if flag_match else "")
+            report.add(section, table_result)
+        else:
+            report.add(section, line)
+
+    for queue in table_results.values():
+        for result in queue:
+            result.section = UNMATCHED_TABLE_SECTION
+            report.add(result.section, result)
+    return report
+
+
+def serialize_for_prompt(report):
+    """Serialize a ParsedReport into compact, token-friendly plain text."""
+    lines = [PROMPT_HEADER] if report.records else []
+    for section, entries in report.sections.items():
+        if section:
+            lines.append(f"## {section}")
+        for entry in entries:
+            lines.append(entry.to_row() if isinstance(entry, LabResult) else entry)
+    return "\n".join(lines)
+
+
+def split_report_sections(text):
+    """Split report text into (section, body) pairs at its section headings.
+
+    Accepts both the compact serialization ("## 血常规" headings) and raw
+    report text. Lines before the first heading (personal info, ...) form a
+    section with an empty name; the PROMPT_HEADER line is not repeated in
+    any body. Sections without content are dropped.
+    """
+    sections = []
+    title, body = "", []
+    for raw_line in (text or "").splitlines():
+        line = raw_line.strip()
+        if not line or line == PROMPT_HEADER:
+            continue
+        heading = line[3:].strip() if line.startswith("## ") else _section_title(line)
+        if heading:
+            if body:
+                sections.append((title, "\n".join(body)))
+            title, body = heading, []
+            continue
+        body.append(line)
+    if body:
+        sections.append((title, "\n".join(body)))
+    return sections
+
+
+def build_report_prompt(text, tables=None):
+    """Parse report text and return its compact prompt serialization."""
+    return serialize_for_prompt(parse_lab_report(text, tables))
@@ -0,0 +1,170 @@
+import re
+import threading
+from abc import ABC, abstractmethod
+from io import BytesIO
+
+import pdfplumber
+import pypdfium2 as pdfium
+
+# pdfium is not thread-safe: every call into it must hold this lock
+_PDFIUM_LOCK = threading.Lock()
+
+# A bare number on its own line, e.g. "88" or "<0.5"
+_LONE_VALUE_PATTERN = re.compile(r"^[<>≤≥]?\s*[-+]?\d+(?:[.,]\d+)?\s*$")
+
+# Share of lone-value lines above which the fast text is considered to have
+# lost the table row layout (one cell per line)
+TABLE_LAYOUT_THRESHOLD = 0.25
+TABLE_LAYOUT_MIN_LINES = 10
+
+
+def _layout_lost(text):
+    """Heuristic: True if table rows were split into one cell per line."""
+    lines = [line.strip() for line in text.splitlines() if line.strip()]
+    if len(lines) < TABLE_LAYOUT_MIN_LINES:
+        return False
+    lone_values = sum(1 for line in lines if _LONE_VALUE_PATTERN.match(line))
+    return lone_values / len(lines) >= TABLE_LAYOUT_THRESHOLD
+
+
+class PdfDocument(ABC):
+    """An open PDF whose pages can be extracted one at a time."""
+
+    @abstractmethod
+    def __len__(self):
+        """Return the number of pages."""
+
+    @abstractmethod
+    def extract_page(self, index):
+        """Return the text of the page at index ("" when it has no text)."""
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+
+class PdfBackend(ABC):
+    """Interface for page-level text extraction backends."""
+
+    name = None
+
+    @abstractmethod
+    def open(self, pdf_bytes):
+        """Open raw PDF bytes and return a PdfDocument."""
+
+
+class _PdfplumberDocument(PdfDocument):
+    def __init__(self, pdf_bytes):
+        self._pdf = pdfplumber.open(BytesIO(pdf_bytes))
+
+    def __len__(self):
+        return len(self._pdf.pages)
+
+    def extract_page(self, index):
+        return self._pdf.pages[index].extract_text() or ""
+
+    def extract_tables(self, index):
+        return self._pdf.pages[index].extract_tables()
+
+    def close(self):
+        self._pdf.close()
+
+
+class PdfplumberBackend(PdfBackend):
+    """Layout-aware extraction; slower but keeps table rows together."""
+
+    name = "pdfplumber"
+
+    def open(self, pdf_bytes):
+        return _PdfplumberDocument(pdf_bytes)
+
+
+class _PdfiumDocument(PdfDocument):
+    def __init__(self, pdf_bytes):
+        with _PDFIUM_LOCK:
+            self._pdf = pdfium.PdfDocument(pdf_bytes)
+
+    def __len__(self):
+        return len(self._pdf)
+
+    def extract_page(self, index):
+        with _PDFIUM_LOCK:
+            page = self._pdf[index]
+            textpage = page.get_textpage()
+            try:
+                text = textpage.get_text_range()
+            finally:
+                textpage.close()
+                page.close()
+        return text.replace("\r\n", "\n").replace("\r", "\n").strip()
+
+    def close(self):
+        with _PDFIUM_LOCK:
+            self._pdf.close()
+
+
+class PdfiumBackend(PdfBackend):
+    """Fast raw text extraction through pypdfium2, without layout analysis."""
+
+    name = "pdfium"
+
+    def open(self, pdf_bytes):
+        return _PdfiumDocument(pdf_bytes)
+
+
+class _HybridDocument(PdfDocument):
+    def __init__(self, pdf_bytes):
+        self._pdf_bytes = pdf_bytes
+        self._fast = _PdfiumDocument(pdf_bytes)
+        self._layout = None  # pdfplumber is opened only when a page needs it
+        self.fallback_pages = 0
+
+    def __len__(self):
+        return len(self._fast)
+
+    def extract_page(self, index):
+        text = self._fast.extract_page(index)
+        if text and not _layout_lost(text):
+            return text
+        if self._layout is None:
+            self._layout = _PdfplumberDocument(self._pdf_bytes)
+        self.fallback_pages += 1
+        return self._layout.extract_page(index) or text
+
+    def close(self):
+        self._fast.close()
+        if self._layout is not None:
+            self._layout.close()
+
+
+class HybridBackend(PdfBackend):
+    """pypdfium2 by default, pdfplumber for pages where layout matters.
+
+    A page falls back to pdfplumber when the fast path returns no text or
+    when its table rows came out as one cell per line.
+    """
+
+    name = "hybrid"
+
+    def open(self, pdf_bytes):
+        return _HybridDocument(pdf_bytes)
+
+
+BACKENDS = {
+    backend.name: backend
+    for backend in (PdfiumBackend(), PdfplumberBackend(), HybridBackend())
+}
+
+
+def get_backend(name):
+    """Look up an extraction backend by name."""
+    try:
+        return BACKENDS[name]
+    except KeyError:
+        raise ValueError(f"Unknown PDF text backend: {name}") from None
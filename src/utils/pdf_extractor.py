@@ -1,32 +1,260 @@
-import pdfplumber
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from contextlib import closing
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
 import streamlit as st
-from config.app_config import MAX_PDF_PAGES
-from utils.validators import validate_pdf_file, validate_pdf_content
+from config.app_config import (
+    MAX_PDF_PAGES,
+    PDF_EXTRACT_WORKERS,
+    PDF_PARALLEL_MIN_PAGES,
+    PDF_CLASSIFY_PAGE_WINDOW,
+    PDF_TEXT_BACKEND,
+    PDF_PARALLEL_TIMEOUT_SECONDS,
+)
+from utils.pdf_backends import get_backend
+from utils.text_normalizer import normalize_pages
+from utils.validators import validate_pdf_file, validate_pdf_content, MedicalContentChecker
+from utils.extraction_cache import get_extraction_cache, make_cache_key
+
+# Bump whenever the extraction output changes so cached results are invalidated
+EXTRACTOR_VERSION = "5"
+
+SCANNED_DOCUMENT_ERROR = "Could not extract text from PDF. Please ensure it's not a scanned document."
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+class PdfExtractionError(Exception):
+    """Raised while streaming pages when the PDF must be rejected."""
+
+class ExtractionError(str):
+    """Message returned by extract_text_from_pdf instead of report text.
+
+    A str subclass, so callers can show it directly; detect it with
+    is_extraction_error rather than by matching the message text.
+    """
+
+def _read_pdf_bytes(pdf_file):
+    """Return the raw bytes of an uploaded file without consuming it."""
+    if hasattr(pdf_file, "getvalue"):
+        return pdf_file.getvalue()
+    position = pdf_file.tell()
+    data = pdf_file.read()
+    pdf_file.seek(position)
+    return data
 
 def extract_text_from_pdf(pdf_file):
-    """Extract and validate text from PDF file."""
+    """Extract and validate text from PDF file.
+
+    Results are cached by content hash, so Streamlit reruns with the same
+    upload do not parse the PDF again.
+    """
     try:
         # Validate file first
         is_valid, error = validate_pdf_file(pdf_file)
         if not is_valid:
-            return error
-
-        text = ""
-        with pdfplumber.open(pdf_file) as pdf:
-            if len(pdf.pages) > MAX_PDF_PAGES:
-                return f"PDF exceeds maximum page limit of {MAX_PDF_PAGES}"
-                
-            for page in pdf.pages:
-                extracted = page.extract_text()
+            return ExtractionError(error)
+
+        key = make_cache_key(
+            _read_pdf_bytes(pdf_file), "text", EXTRACTOR_VERSION, PDF_TEXT_BACKEND, MAX_PDF_PAGES
+        )
+        result = get_extraction_cache().get_or_compute(
+            key,
+            lambda: _extract_and_validate(pdf_file),
+            should_cache=lambda result: not (isinstance(result, dict) and result.get("transient")),
+        )
+        # Rejections are cached as {"error": ...} so they survive the JSON disk tier
+        if isinstance(result, dict):
+            return ExtractionError(result["error"])
+        return result
+    except Exception as e:
+        return ExtractionError(f"Error extracting text from PDF: {str(e)}")
+
+def is_extraction_error(result):
+    """Return True if extract_text_from_pdf returned an error message instead of text."""
+    return isinstance(result, ExtractionError)
+
+def iter_pdf_pages(pdf_file, backend_name=PDF_TEXT_BACKEND):
+    """Yield the text of each page in page order.
+
+    The page-limit check runs before any page is parsed, and the first
+    empty page aborts the stream as a scanned document. Raises
+    PdfExtractionError for both cases.
+
+    The first PDF_CLASSIFY_PAGE_WINDOW pages are always extracted serially,
+    so a document rejected by the caller within that window never reaches
+    the process pool; only the remaining pages are fanned out.
+    """
+    pdf_bytes = _read_pdf_bytes(pdf_file)
+    with get_backend(backend_name).open(pdf_bytes) as document:
+        page_count = len(document)
+        if page_count > MAX_PDF_PAGES:
+            raise PdfExtractionError(f"PDF exceeds maximum page limit of {MAX_PDF_PAGES}")
+
+        window = min(PDF_CLASSIFY_PAGE_WINDOW, page_count)
+        if _get_worker_count(page_count - window) > 1:
+            page_texts = _chain_pages(
+                (document.extract_page(index) for index in range(window)),
+                _iter_pages_parallel(document, pdf_bytes, window, page_count, backend_name),
+            )
+        else:
+            page_texts = (document.extract_page(index) for index in range(page_count))
+
+        with closing(page_texts):
+            for extracted in page_texts:
                 if not extracted:
-                    return "Could not extract text from PDF. Please ensure it's not a scanned document."
-                text += extracted + "\n"
-        
+                    raise PdfExtractionError(SCANNED_DOCUMENT_ERROR)
+                yield extracted
+
+def extract_tables_from_pdf(pdf_file):
+    """Extract pdfplumber tables from every page, cached by content hash.
+
+    Returns a list of tables (rows of string cells); an empty list when the
+    PDF cannot be parsed.
+    """
+    try:
+        pdf_bytes = _read_pdf_bytes(pdf_file)
+        key = make_cache_key(pdf_bytes, "tables", EXTRACTOR_VERSION, MAX_PDF_PAGES)
+        return get_extraction_cache().get_or_compute(key, lambda: _extract_tables(pdf_bytes))
+    except Exception:
+        return []
+
+def _extract_tables(pdf_bytes):
+    """Run pdfplumber table detection on each page (uncached)."""
+    tables = []
+    with get_backend("pdfplumber").open(pdf_bytes) as document:
+        for index in range(min(len(document), MAX_PDF_PAGES)):
+            for table in document.extract_tables(index):
+                tables.append([[cell or "" for cell in row] for row in table])
+    return tables
+
+def _extract_and_validate(pdf_file):
+    """Parse the PDF and validate its content (uncached).
+
+    The medical-term check runs as pages arrive, so a document that is not
+    classified as a medical report within PDF_CLASSIFY_PAGE_WINDOW pages is
+    rejected without parsing the rest. Accepted text is normalized to drop
+    headers, footers and page numbers repeated on every page.
+
+    Returns the text, or {"error": message} when the PDF is rejected;
+    unexpected failures are marked "transient" so they are not cached.
+    """
+    try:
+        pages = []
+        checker = MedicalContentChecker()
+        with closing(iter_pdf_pages(pdf_file)) as page_stream:
+            for extracted in page_stream:
+                pages.append(extracted)
+                if not checker.feed(extracted) and len(pages) >= PDF_CLASSIFY_PAGE_WINDOW:
+                    break
+
+        text, stats = normalize_pages(pages)
+
         # Validate extracted content
-        is_valid, error = validate_pdf_content(text)
+        is_valid, error = validate_pdf_content(text, checker)
         if not is_valid:
-            return error
-            
+            return {"error": error}
+
+        logger.info(
+            "PDF normalization saved %d chars (~%d tokens) over %d pages: "
+            "%d repeated lines, %d page numbers removed",
+            stats.chars_saved, stats.tokens_saved, stats.pages,
+            stats.repeated_lines_removed, stats.page_numbers_removed,
+        )
         return text
+    except PdfExtractionError as e:
+        return {"error": str(e)}
     except Exception as e:
-        return f"Error extracting text from PDF: {str(e)}"
+        return {"error": f"Error extracting text from PDF: {str(e)}", "transient": True}
+
+def _get_worker_count(page_count):
+    """Number of worker processes to use; 1 means serial extraction."""
+    if page_count < PDF_PARALLEL_MIN_PAGES:
+        return 1
+    return max(1, min(PDF_EXTRACT_WORKERS, os.cpu_count() or 1, page_count))
+
+def _get_executor():
+    """Lazily create the process pool shared by all sessions.
+
+    Workers are spawned rather than forked: forking the multi-threaded
+    Streamlit server can copy a lock (e.g. the pdfium lock) in its held
+    state into the child, which then hangs forever.
+    """
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ProcessPoolExecutor(
+                    max_workers=max(1, PDF_EXTRACT_WORKERS),
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+    return _executor
+
+def _discard_executor(executor):
+    """Drop a pool that timed out or broke so the next caller gets a fresh one."""
+    global _executor
+    with _executor_lock:
+        if _executor is executor:
+            _executor = None
+    executor.shutdown(wait=False, cancel_futures=True)
+
+def _chain_pages(*iterators):
+    """Chain page generators, closing all of them when the chain is closed."""
+    try:
+        for iterator in iterators:
+            yield from iterator
+    finally:
+        for iterator in iterators:
+            iterator.close()
+
+def _extract_page_range(pdf_bytes, start, end, backend_name):
+    """Worker entry point: extract text of pages [start, end)."""
+    with get_backend(backend_name).open(pdf_bytes) as document:
+        return [document.extract_page(index) for index in range(start, end)]
+
+def _iter_pages_parallel(document, pdf_bytes, first_page, page_count, backend_name):
+    """Fan pages [first_page, page_count) out to the process pool in contiguous ranges.
+
+    Yields page texts in page order; pending ranges are cancelled if the
+    caller stops early (e.g. on a scanned page). If the pool does not
+    deliver within PDF_PARALLEL_TIMEOUT_SECONDS, or breaks, the pool is
+    discarded and the remaining pages are extracted serially from document.
+    """
+    remaining = page_count - first_page
+    chunk_size = -(-remaining // _get_worker_count(remaining))
+    executor = _get_executor()
+    ranges = [
+        (start, min(start + chunk_size, page_count))
+        for start in range(first_page, page_count, chunk_size)
+    ]
+    futures = [
+        executor.submit(_extract_page_range, pdf_bytes, start, end, backend_name)
+        for start, end in ranges
+    ]
+    deadline = time.monotonic() + PDF_PARALLEL_TIMEOUT_SECONDS
+    next_page = first_page
+    try:
+        for future in futures:
+            try:
+                texts = future.result(timeout=max(0.0, deadline - time.monotonic()))
+            except (FutureTimeoutError, BrokenProcessPool) as e:
+                logger.warning(
+                    "Parallel PDF extraction failed (%s); extracting pages %d-%d serially",
+                    type(e).__name__, next_page + 1, page_count,
+                )
+                _discard_executor(executor)
+                for index in range(next_page, page_count):
+                    yield document.extract_page(index)
+                return
+            next_page += len(texts)
+            yield from texts
+    finally:
+        for future in futures:
+            future.cancel()
@@ -0,0 +1,195 @@
+import math
+import re
+import threading
+from collections import Counter
+from dataclasses import dataclass
+
+from utils.token_estimator import estimate_tokens
+
+# "第 1 页", "第1页/共3页", "共3页 第1页", "Page 2 of 5", "- 3 -"
+_PAGE_LABEL_PATTERN = re.compile(
+    r"^(?:第\s*\d+\s*页(?:\s*[/，,]?\s*共\s*\d+\s*页)?"
+    r"|共\s*\d+\s*页\s*第\s*\d+\s*页"
+    r"|page\s*\d+(?:\s*(?:of|/)\s*\d+)?"
+    r"|-\s*\d+\s*-)$",
+    re.IGNORECASE,
+)
+# "2" or "2/5" without page context: also a plausible lab value or a blood
+# pressure reading, so only dropped when it counts up from page to page.
+_BARE_NUMBER_PATTERN = re.compile(r"^(\d{1,3})(?:\s*/\s*(\d{1,3}))?$")
+
+# Labelled page numbers are only looked for this close to the page edge
+PAGE_NUMBER_EDGE_LINES = 3
+# Headers/footers are looked for in at most the first/last EDGE_LINES of a
+# page, and never in more than EDGE_SHARE of each end of a short page, so
+# the body of a page is never a boilerplate candidate.
+EDGE_LINES = 8
+EDGE_SHARE = 0.25
+MIN_BOILERPLATE_LENGTH = 4
+MIN_REPEAT_RATIO = 0.5
+# With fewer pages, a repeated line is as likely a repeated finding
+MIN_BOILERPLATE_PAGES = 3
+
+
+@dataclass
+class NormalizationStats:
+    """How much a normalization pass shrank the report text."""
+
+    pages: int = 0
+    original_chars: int = 0
+    normalized_chars: int = 0
+    original_tokens: int = 0
+    normalized_tokens: int = 0
+    repeated_lines_removed: int = 0
+    page_numbers_removed: int = 0
+
+    @property
+    def chars_saved(self):
+        return self.original_chars - self.normalized_chars
+
+    @property
+    def tokens_saved(self):
+        return self.original_tokens - self.normalized_tokens
+
+
+_totals = NormalizationStats()
+_totals_lock = threading.Lock()
+
+
+def _is_page_label(line, index, line_count):
+    near_edge = index < PAGE_NUMBER_EDGE_LINES or index >= line_count - PAGE_NUMBER_EDGE_LINES
+    return near_edge and bool(_PAGE_LABEL_PATTERN.match(line))
+
+
+def _bare_page_numbers(pages_lines):
+    """Find bare page numbers: the first or last line of a page holding a
+    number that increases in step with the page index on another page.
+
+    Returns a set of (page index, line index) pairs.
+    """
+    found = set()
+    for position in (0, -1):
+        candidates = []
+        for page_index, lines in enumerate(pages_lines):
+            if not lines:
+                continue
+            match = _BARE_NUMBER_PATTERN.match(lines[position])
+            if match:
+                line_index = position % len(lines)
+                candidates.append((page_index, line_index, int(match.group(1)), match.group(2)))
+        for page_index, line_index, number, total in candidates:
+            if any(
+                other_page != page_index
+                and other_total == total
+                and other_number - number == other_page - page_index
+                for other_page, _, other_number, other_total in candidates
+            ):
+                found.add((page_index, line_index))
+    return found
+
+
+def _edge_depth(lines):
+    return min(EDGE_LINES, int(len(lines) * EDGE_SHARE))
+
+
+def _edge_slots(lines):
+    """(offset, line) pairs for the header/footer region of a page.
+
+    Offsets count from the top (0, 1, ...) and from the bottom (-1, -2, ...),
+    so a line only matches the same line at the same distance from the edge.
+    """
+    depth = _edge_depth(lines)
+    return [(offset, lines[offset]) for offset in range(depth)] + [
+        (-offset, lines[-offset]) for offset in range(1, depth + 1)
+    ]
+
+
+def _boilerplate_indexes(lines, repeated):
+    """Indexes of the repeated header/footer lines of one page.
+
+    Headers and footers are contiguous runs from the page edge: the run
+    stops at the first line that is not repeated at its offset, so a
+    finding below a page-specific section heading is never matched.
+    """
+    depth = _edge_depth(lines)
+    indexes = set()
+    for offsets in (range(depth), range(-1, -depth - 1, -1)):
+        for offset in offsets:
+            if (offset, lines[offset]) not in repeated:
+                break
+            indexes.add(offset % len(lines))
+    return indexes
+
+
+def normalize_pages(pages):
+    """Strip cross-page boilerplate from per-page texts and join them.
+
+    - Collapses runs of whitespace and drops blank lines.
+    - Drops page-number lines: labelled ones ("第 2 页", "Page 2", "- 2 -")
+      near the page edge, and bare ones ("2", "2/5") on the first or last
+      line only when they count up across pages.
+    - Keeps only the first copy of header/footer lines that repeat at the
+      same distance from the page edge on at least MIN_REPEAT_RATIO of the
+      pages, for documents of at least MIN_BOILERPLATE_PAGES pages.
+
+    Returns (text, NormalizationStats).
+    """
+    stats = NormalizationStats(pages=len(pages))
+    all_raw_lines = []
+    for page in pages:
+        stats.original_chars += len(page) + 1
+        raw_lines = [" ".join(line.split()) for line in page.splitlines()]
+        all_raw_lines.append([line for line in raw_lines if line])
+
+    bare_numbers = _bare_page_numbers(all_raw_lines)
+    page_lines = []
+    for page_index, raw_lines in enumerate(all_raw_lines):
+        lines = []
+        for index, line in enumerate(raw_lines):
+            if (page_index, index) in bare_numbers or _is_page_label(line, index, len(raw_lines)):
+                stats.page_numbers_removed += 1
+            else:
+                lines.append(line)
+        page_lines.append(lines)
+
+    repeated = set()
+    if len(pages) >= MIN_BOILERPLATE_PAGES:
+        occurrences = Counter(slot for lines in page_lines for slot in _edge_slots(lines))
+        threshold = max(2, math.ceil(len(pages) * MIN_REPEAT_RATIO))
+        repeated = {
+            slot for slot, count in occurrences.items()
+            if count >= threshold and len(slot[1]) >= MIN_BOILERPLATE_LENGTH
+        }
+
+    kept = []
+    seen_repeated = set()
+    for lines in page_lines:
+        boilerplate = _boilerplate_indexes(lines, repeated) if repeated else set()
+        for index, line in enumerate(lines):
+            if index in boilerplate:
+                if line in seen_repeated:
+                    stats.repeated_lines_removed += 1
+                    continue
+                seen_repeated.add(line)
+            kept.append(line)
+
+    text = "\n".join(kept) + "\n" if kept else ""
+    stats.normalized_chars = len(text)
+    stats.original_tokens = estimate_tokens("\n".join(pages))
+    stats.normalized_tokens = estimate_tokens(text)
+    _record(stats)
+    return text, stats
+
+
+def _record(stats):
+    with _totals_lock:
+        for name in NormalizationStats.__dataclass_fields__:
+            setattr(_totals, name, getattr(_totals, name) + getattr(stats, name))
+
+
+def get_normalization_totals():
+    """Cumulative savings across all reports normalized by this process."""
+    with _totals_lock:
+        return NormalizationStats(**{
+            name: getattr(_totals, name) for name in NormalizationStats.__dataclass_fields__
+        })
@@ -0,0 +1,65 @@
+import math
+import re
+
+# CJK ideographs and full-width punctuation are roughly one token each for
+# Llama-family tokenizers; other text averages about four characters per token.
+_CJK_PATTERN = re.compile(r"[　-〿一-鿿＀-￯]")
+CJK_TOKENS_PER_CHAR = 1.2
+CHARS_PER_TOKEN = 4.0
+
+
+def estimate_tokens(text):
+    """Estimate the number of model tokens in text without a tokenizer."""
+    if not text:
+        return 0
+    cjk_chars = len(_CJK_PATTERN.findall(text))
+    other_chars = len(text) - cjk_chars
+    return math.ceil(cjk_chars * CJK_TOKENS_PER_CHAR + other_chars / CHARS_PER_TOKEN)
+
+
+def _is_priority_line(line):
+    """Section headers and flagged lab rows are kept as long as possible."""
+    if line.startswith("#"):
+        return True
+    fields = line.split("|")
+    return len(fields) == 5 and bool(fields[-1].strip())
+
+
+def fit_to_budget(text, max_tokens):
+    """Compact text so that its estimated size fits within max_tokens.
+
+    Whitespace is collapsed and blank or repeated lines are dropped first.
+    If the text is still too large, ordinary lines are removed from the end,
+    keeping section headers and flagged lab rows (see utils.lab_parser), and
+    finally those too. Returns (text, omitted_lines).
+    """
+    if estimate_tokens(text) <= max_tokens:
+        return text, 0
+
+    lines = []
+    seen = set()
+    for raw in text.splitlines():
+        line = " ".join(raw.split())
+        if not line or line in seen:
+            continue
+        seen.add(line)
+        lines.append(line)
+
+    # Per-line estimates plus one token for the newline keep trimming linear
+    costs = [estimate_tokens(line) + 1 for line in lines]
+    total = sum(costs)
+    keep = [True] * len(lines)
+    omitted = 0
+    for priority_pass in (False, True):
+        for index in range(len(lines) - 1, -1, -1):
+            if total <= max_tokens:
+                break
+            if keep[index] and _is_priority_line(lines[index]) == priority_pass:
+                keep[index] = False
+                total -= costs[index]
+                omitted += 1
+
+    kept = [line for line, flag in zip(lines, keep) if flag]
+    if omitted:
+        kept.append(f"（报告过长，已省略 {omitted} 行）")
+    return "\n".join(kept), omitted
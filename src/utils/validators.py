@@ -51,24 +51,57 @@ def validate_pdf_file(file):
         
     return True, None
 
-def validate_pdf_content(text):
-    """Validate if the PDF content appears to be a medical report."""
-    # Common medical report indicators
-    medical_terms = [
-        'blood', 'test', 'report', 'laboratory', 'lab', 'patient', 'specimen',
-        'reference range', 'analysis', 'results', 'medical', 'diagnostic',
-        'hemoglobin', 'wbc', 'rbc', 'platelet', 'glucose', 'creatinine'
-    ]
-    
+# Common medical report indicators
+MEDICAL_TERMS = [
+    'blood', 'test', 'report', 'laboratory', 'lab', 'patient', 'specimen',
+    'reference range', 'analysis', 'results', 'medical', 'diagnostic',
+    'hemoglobin', 'wbc', 'rbc', 'platelet', 'glucose', 'creatinine'
+]
+MIN_MEDICAL_TERM_MATCHES = 3
+_MAX_TERM_LENGTH = max(len(term) for term in MEDICAL_TERMS)
+
+class MedicalContentChecker:
+    """Incrementally check whether streamed text looks like a medical report.
+
+    Feed page texts one at a time; once enough distinct medical terms have
+    been seen the document is classified and further pages are not scanned.
+    """
+
+    def __init__(self):
+        self.found_terms = set()
+        self._tail = ""  # End of the previous chunk, so terms split across pages still match
+
+    @property
+    def is_medical(self):
+        return len(self.found_terms) >= MIN_MEDICAL_TERM_MATCHES
+
+    def feed(self, text):
+        """Scan another chunk of text; return True once classified as medical."""
+        if self.is_medical:
+            return True
+        window = self._tail + text.lower()
+        for term in MEDICAL_TERMS:
+            if term not in self.found_terms and term in window:
+                self.found_terms.add(term)
+        self._tail = window[-(_MAX_TERM_LENGTH - 1):]
+        return self.is_medical
+
+def validate_pdf_content(text, checker=None):
+    """Validate if the PDF content appears to be a medical report.
+
+    Pass the checker that was already fed the text page by page to avoid
+    scanning it again.
+    """
     # Validate minimum text length
     if len(text.strip()) < 50:
         return False, "Extracted text is too short. Please ensure the PDF contains valid text."
     
     # Check for medical terms
-    text_lower = text.lower()
-    term_matches = sum(1 for term in medical_terms if term in text_lower)
+    if checker is None:
+        checker = MedicalContentChecker()
+        checker.feed(text)
     
-    if term_matches < 3:
+    if not checker.is_medical:
         return False, "The uploaded file doesn't appear to be a medical report. Please upload a valid medical report."
     
     return True, None
\ No newline at end of file
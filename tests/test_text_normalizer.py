@@ -0,0 +1,43 @@
+from utils.text_normalizer import normalize_pages
+
+
+def _page(number, section, finding):
+    return "\n".join([
+        "XX医院健康体检中心",
+        "体检编号：20240001 姓名：张三",
+        section,
+        finding,
+        "建议定期复查",
+        "检查医生：李四",
+        "本报告仅供临床参考",
+        f"第 {number} 页",
+    ])
+
+
+def test_repeated_findings_under_different_sections_are_kept():
+    pages = [
+        _page(1, "【腹部B超】", "未见明显异常"),
+        _page(2, "【心电图】", "未见明显异常"),
+        _page(3, "【胸部DR】", "未见明显异常"),
+    ]
+
+    text, stats = normalize_pages(pages)
+
+    lines = text.splitlines()
+    assert lines.count("未见明显异常") == 3
+    assert lines.count("建议定期复查") == 3
+    assert lines.count("XX医院健康体检中心") == 1
+    assert lines.count("本报告仅供临床参考") == 1
+    assert stats.page_numbers_removed == 3
+
+
+def test_two_page_report_keeps_repeated_lines():
+    pages = [
+        _page(1, "【一般检查】", "未见明显异常"),
+        _page(2, "【腹部B超】", "未见明显异常"),
+    ]
+
+    text, stats = normalize_pages(pages)
+
+    assert text.splitlines().count("未见明显异常") == 2
+    assert stats.repeated_lines_removed == 0